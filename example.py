@@ -7,69 +7,68 @@ This can be used to test the system without a video file
 import numpy as np
 from pv_analyzer import PhaseDetector, EnergyCalculator, PerformanceComparator
 from pv_analyzer.phase_detector import VaultPhase
+from pv_analyzer.landmarks import LANDMARK_NAMES, LandmarksBuffer
 
 
-def generate_synthetic_landmarks(num_frames=180, fps=30):
+# Per-landmark (dx, dy, z, visibility) relative to the hip centre, in pixels
+LANDMARK_OFFSETS = np.array([
+    [0, -40, 0, 0.99],    # nose
+    [-15, -30, 0, 0.95],  # left_shoulder
+    [15, -30, 0, 0.95],   # right_shoulder
+    [-25, -10, 0, 0.90],  # left_elbow
+    [25, -10, 0, 0.90],   # right_elbow
+    [-30, 5, 0, 0.85],    # left_wrist
+    [30, 5, 0, 0.85],     # right_wrist
+    [-10, 0, 0, 0.98],    # left_hip
+    [10, 0, 0, 0.98],     # right_hip
+    [-15, 30, 0, 0.92],   # left_knee
+    [15, 30, 0, 0.92],    # right_knee
+    [-18, 60, 0, 0.88],   # left_ankle
+    [18, 60, 0, 0.88],    # right_ankle
+    [-20, 65, 0, 0.85],   # left_heel
+    [20, 65, 0, 0.85],    # right_heel
+    [-18, 68, 0, 0.82],   # left_foot_index
+    [18, 68, 0, 0.82],    # right_foot_index
+], dtype=np.float32)
+
+
+def generate_synthetic_landmark_array(num_frames=180, fps=30):
     """
-    Generate synthetic pose landmarks simulating a pole vault
+    Generate synthetic pose landmarks as a (num_frames, 17, 4) array
+    
+    The last axis holds (x, y, z, visibility); landmark order follows
+    LANDMARK_NAMES.
     
     Args:
         num_frames: Number of frames to generate
         fps: Frames per second
         
     Returns:
-        List of landmark dictionaries
+        float32 NumPy array of landmarks
     """
-    landmarks_list = []
+    t = np.arange(num_frames) / fps  # Time in seconds
     
-    for i in range(num_frames):
-        # Simulate motion through different phases
-        t = i / fps  # Time in seconds
-        
-        # Simulate horizontal motion (run, then slow down)
-        if t < 3.0:  # Run phase
-            x_pos = 100 + t * 150
-            y_hip = 400
-        elif t < 3.5:  # Plant/takeoff
-            x_pos = 550 + (t - 3.0) * 50
-            y_hip = 400 - (t - 3.0) * 100
-        elif t < 4.5:  # Swing-up
-            x_pos = 575
-            y_hip = 350 - (t - 3.5) * 150
-        elif t < 5.2:  # Extension/inversion
-            x_pos = 580
-            y_hip = 200 - (t - 4.5) * 80
-        elif t < 5.6:  # Push-off
-            x_pos = 585
-            y_hip = 140 - (t - 5.2) * 50
-        else:  # Pike/descent
-            x_pos = 590 + (t - 5.6) * 20
-            y_hip = 120 + (t - 5.6) * 100
-        
-        # Create landmark dictionary
-        landmarks = {
-            'nose': {'x': x_pos, 'y': y_hip - 40, 'z': 0, 'visibility': 0.99},
-            'left_shoulder': {'x': x_pos - 15, 'y': y_hip - 30, 'z': 0, 'visibility': 0.95},
-            'right_shoulder': {'x': x_pos + 15, 'y': y_hip - 30, 'z': 0, 'visibility': 0.95},
-            'left_elbow': {'x': x_pos - 25, 'y': y_hip - 10, 'z': 0, 'visibility': 0.90},
-            'right_elbow': {'x': x_pos + 25, 'y': y_hip - 10, 'z': 0, 'visibility': 0.90},
-            'left_wrist': {'x': x_pos - 30, 'y': y_hip + 5, 'z': 0, 'visibility': 0.85},
-            'right_wrist': {'x': x_pos + 30, 'y': y_hip + 5, 'z': 0, 'visibility': 0.85},
-            'left_hip': {'x': x_pos - 10, 'y': y_hip, 'z': 0, 'visibility': 0.98},
-            'right_hip': {'x': x_pos + 10, 'y': y_hip, 'z': 0, 'visibility': 0.98},
-            'left_knee': {'x': x_pos - 15, 'y': y_hip + 30, 'z': 0, 'visibility': 0.92},
-            'right_knee': {'x': x_pos + 15, 'y': y_hip + 30, 'z': 0, 'visibility': 0.92},
-            'left_ankle': {'x': x_pos - 18, 'y': y_hip + 60, 'z': 0, 'visibility': 0.88},
-            'right_ankle': {'x': x_pos + 18, 'y': y_hip + 60, 'z': 0, 'visibility': 0.88},
-            'left_heel': {'x': x_pos - 20, 'y': y_hip + 65, 'z': 0, 'visibility': 0.85},
-            'right_heel': {'x': x_pos + 20, 'y': y_hip + 65, 'z': 0, 'visibility': 0.85},
-            'left_foot_index': {'x': x_pos - 18, 'y': y_hip + 68, 'z': 0, 'visibility': 0.82},
-            'right_foot_index': {'x': x_pos + 18, 'y': y_hip + 68, 'z': 0, 'visibility': 0.82},
-        }
-        
-        landmarks_list.append(landmarks)
+    # Simulate motion through different phases:
+    # run, plant/takeoff, swing-up, extension/inversion, push-off, pike/descent
+    phase_conditions = [t < 3.0, t < 3.5, t < 4.5, t < 5.2, t < 5.6]
+    x_pos = np.select(
+        phase_conditions,
+        [100 + t * 150, 550 + (t - 3.0) * 50, 575, 580, 585],
+        default=590 + (t - 5.6) * 20
+    )
+    y_hip = np.select(
+        phase_conditions,
+        [np.full_like(t, 400), 400 - (t - 3.0) * 100, 350 - (t - 3.5) * 150,
+         200 - (t - 4.5) * 80, 140 - (t - 5.2) * 50],
+        default=120 + (t - 5.6) * 100
+    )
     
-    return landmarks_list
+    landmarks = np.empty((num_frames, len(LANDMARK_NAMES), 4), dtype=np.float32)
+    landmarks[:, :, 0] = x_pos[:, None] + LANDMARK_OFFSETS[:, 0]
+    landmarks[:, :, 1] = y_hip[:, None] + LANDMARK_OFFSETS[:, 1]
+    landmarks[:, :, 2:] = LANDMARK_OFFSETS[:, 2:]
+    
+    return landmarks
 
 
 def main():
@@ -83,7 +82,10 @@ def main():
     print("[1/4] Generating synthetic pole vault data...")
     num_frames = 180
     fps = 30
-    landmarks_list = generate_synthetic_landmarks(num_frames, fps)
+    # Every synthetic frame has a pose, so all frames are valid
+    landmarks = LandmarksBuffer(
+        generate_synthetic_landmark_array(num_frames, fps), np.ones(num_frames, dtype=bool)
+    )
     
     video_info = {
         'fps': fps,
@@ -97,7 +99,7 @@ def main():
     # Detect phases
     print("[2/4] Detecting pole vault phases...")
     phase_detector = PhaseDetector()
-    phases = phase_detector.detect_phases(landmarks_list, video_info)
+    phases = phase_detector.detect_phases(landmarks, video_info)
     
     print(f"✓ Detected {len(phases)} phases\n")
     print(phase_detector.get_phase_summary())
@@ -110,7 +112,7 @@ def main():
         pixel_to_meter_ratio=0.01
     )
     phase_energies = energy_calculator.calculate_phase_energies(
-        landmarks_list, phases, video_info
+        landmarks, phases, video_info
     )
     
     print("✓ Energy calculations complete\n")
@@ -2,17 +2,41 @@
 AI_PVSim - Pole Vault Video Analysis System
 """
 
+import importlib
+
 __version__ = "0.1.0"
 __author__ = "sandiegoi-PV"
 
-from .video_processor import VideoProcessor
-from .phase_detector import PhaseDetector
-from .energy_calculator import EnergyCalculator
-from .performance_comparator import PerformanceComparator
+# Public names and the submodules that define them. Submodules are imported
+# on first attribute access (PEP 562) so that using e.g. PhaseDetector does
+# not pull in cv2 and mediapipe via VideoProcessor.
+_LAZY_IMPORTS = {
+    'VideoProcessor': '.video_processor',
+    'PhaseDetector': '.phase_detector',
+    'EnergyCalculator': '.energy_calculator',
+    'PerformanceComparator': '.performance_comparator',
+    'LandmarksBuffer': '.landmarks',
+    'get_pose_model': '.video_processor',
+}
 
 __all__ = [
     'VideoProcessor',
     'PhaseDetector',
     'EnergyCalculator',
     'PerformanceComparator',
+    'LandmarksBuffer',
+    'get_pose_model',
 ]
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -4,7 +4,30 @@ Calculates kinetic and potential energy for each phase of the pole vault
 """
 
 import numpy as np
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
+
+from .landmarks import LANDMARK_INDEX, LandmarksBuffer
+
+
+# Per-phase block of the energy summary, filled from a phase's energy dict
+_PHASE_SUMMARY_TEMPLATE = (
+    "{name}:\n"
+    "  Duration: {duration:.2f}s\n"
+    "  Kinetic Energy:\n"
+    "    Initial: {kinetic_energy[initial]:.2f} J\n"
+    "    Final:   {kinetic_energy[final]:.2f} J\n"
+    "    Max:     {kinetic_energy[max]:.2f} J\n"
+    "  Potential Energy:\n"
+    "    Initial: {potential_energy[initial]:.2f} J\n"
+    "    Final:   {potential_energy[final]:.2f} J\n"
+    "    Max:     {potential_energy[max]:.2f} J\n"
+    "  Total Energy:\n"
+    "    Initial: {total_energy[initial]:.2f} J\n"
+    "    Final:   {total_energy[final]:.2f} J\n"
+    "    Max:     {total_energy[max]:.2f} J\n"
+    "  Energy Generated: {energy_generated:.2f} J\n"
+    "\n"
+)
 
 
 class EnergyCalculator:
@@ -13,6 +36,12 @@ class EnergyCalculator:
     # Physical constants
     GRAVITY = 9.81  # m/s^2
     
+    # Landmark indices used to estimate the center of mass and ground level
+    _COM_IDX = np.array([LANDMARK_INDEX[point] for point in (
+        'left_hip', 'right_hip', 'left_shoulder', 'right_shoulder'
+    )])
+    _ANKLE_IDX = np.array([LANDMARK_INDEX['left_ankle'], LANDMARK_INDEX['right_ankle']])
+    
     def __init__(self, athlete_mass: float = 70.0, pixel_to_meter_ratio: float = 0.01):
         """
         Initialize energy calculator
@@ -24,13 +53,14 @@ class EnergyCalculator:
         self.athlete_mass = athlete_mass
         self.pixel_to_meter = pixel_to_meter_ratio
         
-    def calculate_phase_energies(self, landmarks_list: List[Optional[dict]], 
+    def calculate_phase_energies(self, landmarks_list: Union[List[Optional[dict]], LandmarksBuffer], 
                                  phases: List[Dict], video_info: dict) -> Dict:
         """
         Calculate energy for each phase
         
         Args:
-            landmarks_list: List of pose landmarks for each frame
+            landmarks_list: List of pose landmarks for each frame, or a
+                            LandmarksBuffer holding the same data
             phases: List of detected phases
             video_info: Video metadata including fps
             
@@ -40,152 +70,132 @@ class EnergyCalculator:
         fps = video_info['fps']
         phase_energies = {}
         
+        # Convert to contiguous arrays once; phases are views into it
+        if isinstance(landmarks_list, LandmarksBuffer):
+            landmarks = landmarks_list
+        else:
+            landmarks = LandmarksBuffer.from_dict_list(landmarks_list)
+        
+        # Center of mass for the whole video in one pass, shared by all phases
+        video_com = self._get_center_of_mass(landmarks.coords)
+        
         for phase_info in phases:
             phase = phase_info['phase']
             start_frame = phase_info['start_frame']
             end_frame = phase_info['end_frame']
             
             # Extract landmarks for this phase
-            phase_landmarks = landmarks_list[start_frame:end_frame+1]
+            phase_landmarks = landmarks[start_frame:end_frame+1]
+            com = video_com[start_frame:end_frame+1]
             
             # Calculate energies
-            kinetic_energies = self._calculate_kinetic_energy(phase_landmarks, fps)
-            potential_energies = self._calculate_potential_energy(phase_landmarks)
-            total_energies = [ke + pe for ke, pe in zip(kinetic_energies, potential_energies)]
+            kinetic_energies = self._calculate_kinetic_energy(com, phase_landmarks.valid, fps)
+            potential_energies = self._calculate_potential_energy(phase_landmarks, com)
+            total_energies = kinetic_energies + potential_energies
             
-            # Calculate statistics
+            # Calculate statistics; energy generated reuses the endpoints of
+            # the total energy summary
+            total_stats = self._summarize_energies(total_energies)
             phase_energies[phase.value] = {
-                'kinetic_energy': {
-                    'initial': kinetic_energies[0] if kinetic_energies else 0,
-                    'final': kinetic_energies[-1] if kinetic_energies else 0,
-                    'max': max(kinetic_energies) if kinetic_energies else 0,
-                    'average': np.mean(kinetic_energies) if kinetic_energies else 0,
-                },
-                'potential_energy': {
-                    'initial': potential_energies[0] if potential_energies else 0,
-                    'final': potential_energies[-1] if potential_energies else 0,
-                    'max': max(potential_energies) if potential_energies else 0,
-                    'average': np.mean(potential_energies) if potential_energies else 0,
-                },
-                'total_energy': {
-                    'initial': total_energies[0] if total_energies else 0,
-                    'final': total_energies[-1] if total_energies else 0,
-                    'max': max(total_energies) if total_energies else 0,
-                    'average': np.mean(total_energies) if total_energies else 0,
-                },
-                'energy_generated': total_energies[-1] - total_energies[0] if total_energies else 0,
+                'kinetic_energy': self._summarize_energies(kinetic_energies),
+                'potential_energy': self._summarize_energies(potential_energies),
+                'total_energy': total_stats,
+                'energy_generated': total_stats['final'] - total_stats['initial'],
                 'duration': phase_info['duration']
             }
         
         return phase_energies
     
-    def _calculate_kinetic_energy(self, landmarks_list: List[Optional[dict]], fps: float) -> List[float]:
+    def _calculate_kinetic_energy(self, com: np.ndarray, valid: np.ndarray, fps: float) -> np.ndarray:
         """
         Calculate kinetic energy: KE = 0.5 * m * v^2
         
         Args:
-            landmarks_list: List of landmarks for frames in a phase
+            com: Center of mass positions of shape (N, 2) for frames in a phase
+            valid: Boolean mask of shape (N,) marking frames with landmarks
             fps: Frames per second
             
         Returns:
-            List of kinetic energies in Joules
+            Array of kinetic energies in Joules, in the dtype of com
         """
-        kinetic_energies = []
+        if len(com) == 0:
+            return np.zeros(0, dtype=com.dtype)
         
-        for i in range(len(landmarks_list)):
-            if landmarks_list[i] is None:
-                kinetic_energies.append(0.0)
-                continue
-            
-            if i == 0 or landmarks_list[i-1] is None:
-                kinetic_energies.append(0.0)
-                continue
-            
-            # Calculate center of mass velocity
-            com_curr = self._get_center_of_mass(landmarks_list[i])
-            com_prev = self._get_center_of_mass(landmarks_list[i-1])
-            
-            # Calculate displacement in pixels
-            dx = com_curr[0] - com_prev[0]
-            dy = com_curr[1] - com_prev[1]
-            
-            # Convert to meters and calculate velocity
-            dx_m = dx * self.pixel_to_meter
-            dy_m = dy * self.pixel_to_meter
-            dt = 1.0 / fps
-            
-            velocity = np.sqrt(dx_m**2 + dy_m**2) / dt
-            
-            # Calculate kinetic energy
-            ke = 0.5 * self.athlete_mass * velocity**2
-            kinetic_energies.append(ke)
+        # Squared displacement between consecutive frames in pixels
+        displacement = np.diff(com, axis=0)
+        displacement_sq = (displacement * displacement).sum(axis=1)
         
-        return kinetic_energies
+        # v^2 = (|displacement| * pixel_to_meter * fps)^2, so the unit
+        # conversions fold into one scalar and no square root is needed
+        scale = self.pixel_to_meter * fps
+        kinetic = (0.5 * self.athlete_mass * scale * scale) * displacement_sq
+        
+        # No velocity estimate unless both frames of the pair have landmarks
+        kinetic = np.where(valid[1:] & valid[:-1], kinetic, 0.0)
+        
+        # The first frame of a phase has no previous frame
+        return np.concatenate((np.zeros(1, dtype=kinetic.dtype), kinetic))
     
-    def _calculate_potential_energy(self, landmarks_list: List[Optional[dict]]) -> List[float]:
+    def _calculate_potential_energy(self, landmarks: LandmarksBuffer, com: np.ndarray) -> np.ndarray:
         """
         Calculate potential energy: PE = m * g * h
         
         Args:
-            landmarks_list: List of landmarks for frames in a phase
+            landmarks: Landmarks for frames in a phase
+            com: Center of mass positions of shape (N, 2) for the same frames
             
         Returns:
-            List of potential energies in Joules
+            Array of potential energies in Joules, in the dtype of com
         """
-        potential_energies = []
-        
-        # Find ground level (maximum y value across all frames)
-        ground_level = 0
-        for landmarks in landmarks_list:
-            if landmarks is not None:
-                foot_y = max(
-                    landmarks['left_ankle']['y'],
-                    landmarks['right_ankle']['y']
-                )
-                ground_level = max(ground_level, foot_y)
-        
-        for landmarks in landmarks_list:
-            if landmarks is None:
-                potential_energies.append(0.0)
-                continue
-            
-            # Get center of mass height
-            com_y = self._get_center_of_mass(landmarks)[1]
-            
-            # Calculate height above ground in pixels
-            height_pixels = ground_level - com_y  # Invert y-axis
-            
-            # Convert to meters
-            height_m = height_pixels * self.pixel_to_meter
-            
-            # Calculate potential energy
-            pe = self.athlete_mass * self.GRAVITY * height_m
-            potential_energies.append(max(0, pe))  # Ensure non-negative
+        if len(landmarks) == 0:
+            return np.zeros(0, dtype=com.dtype)
+        
+        valid = landmarks.valid
         
-        return potential_energies
+        # Find ground level (maximum ankle y value across all frames) in one
+        # masked reduction, without first copying out the valid frames
+        ground_level = np.max(landmarks.coords[:, self._ANKLE_IDX, 1], where=valid[:, None], initial=0.0)
+        
+        # PE per pixel of height above ground
+        mg_per_pixel = self.athlete_mass * self.GRAVITY * self.pixel_to_meter
+        
+        # Height of the center of mass above ground in pixels (y-axis inverted)
+        potential = mg_per_pixel * (ground_level - com[:, 1])
+        return np.where(valid, np.maximum(0, potential), 0.0)  # Ensure non-negative
     
-    def _get_center_of_mass(self, landmarks: dict) -> tuple:
+    def _summarize_energies(self, energies: np.ndarray) -> Dict[str, float]:
         """
-        Calculate approximate center of mass position
+        Summarize an energy series for a phase
         
         Args:
-            landmarks: Dictionary of pose landmarks
+            energies: Array of energies in Joules
             
         Returns:
-            Tuple of (x, y) coordinates
+            Dictionary with initial, final, max and average energy (all 0
+            for an empty series)
         """
-        # Use key body points to estimate COM
-        key_points = [
-            'left_hip', 'right_hip', 'left_shoulder', 'right_shoulder'
-        ]
-        
-        x_sum = sum(landmarks[point]['x'] for point in key_points)
-        y_sum = sum(landmarks[point]['y'] for point in key_points)
-        
-        com_x = x_sum / len(key_points)
-        com_y = y_sum / len(key_points)
+        if energies.size == 0:
+            return {'initial': 0, 'final': 0, 'max': 0, 'average': 0}
+        
+        return {
+            'initial': float(energies[0]),
+            'final': float(energies[-1]),
+            'max': float(energies.max()),
+            'average': float(energies.mean()),
+        }
+    
+    def _get_center_of_mass(self, coords: np.ndarray) -> np.ndarray:
+        """
+        Calculate approximate center of mass position for each frame
         
-        return (com_x, com_y)
+        Args:
+            coords: Landmark coordinates of shape (N, num_landmarks, 4)
+            
+        Returns:
+            Array of shape (N, 2) with (x, y) coordinates
+        """
+        # Use key body points (hips and shoulders) to estimate COM
+        return coords[:, self._COM_IDX, :2].mean(axis=1)
     
     def get_energy_summary(self, phase_energies: Dict) -> str:
         """
@@ -197,30 +207,14 @@ class EnergyCalculator:
         Returns:
             Formatted summary string
         """
-        summary = "\nEnergy Analysis by Phase:\n"
-        summary += "=" * 70 + "\n\n"
+        parts = ["\nEnergy Analysis by Phase:\n", "=" * 70 + "\n\n"]
         
         for phase_name, energies in phase_energies.items():
-            summary += f"{phase_name.upper()}:\n"
-            summary += f"  Duration: {energies['duration']:.2f}s\n"
-            summary += f"  Kinetic Energy:\n"
-            summary += f"    Initial: {energies['kinetic_energy']['initial']:.2f} J\n"
-            summary += f"    Final:   {energies['kinetic_energy']['final']:.2f} J\n"
-            summary += f"    Max:     {energies['kinetic_energy']['max']:.2f} J\n"
-            summary += f"  Potential Energy:\n"
-            summary += f"    Initial: {energies['potential_energy']['initial']:.2f} J\n"
-            summary += f"    Final:   {energies['potential_energy']['final']:.2f} J\n"
-            summary += f"    Max:     {energies['potential_energy']['max']:.2f} J\n"
-            summary += f"  Total Energy:\n"
-            summary += f"    Initial: {energies['total_energy']['initial']:.2f} J\n"
-            summary += f"    Final:   {energies['total_energy']['final']:.2f} J\n"
-            summary += f"    Max:     {energies['total_energy']['max']:.2f} J\n"
-            summary += f"  Energy Generated: {energies['energy_generated']:.2f} J\n"
-            summary += "\n"
+            parts.append(_PHASE_SUMMARY_TEMPLATE.format_map({**energies, 'name': phase_name.upper()}))
         
         # Calculate total energy generated
         total_generated = sum(e['energy_generated'] for e in phase_energies.values())
-        summary += f"TOTAL ENERGY GENERATED: {total_generated:.2f} J\n"
-        summary += "=" * 70 + "\n"
+        parts.append(f"TOTAL ENERGY GENERATED: {total_generated:.2f} J\n")
+        parts.append("=" * 70 + "\n")
         
-        return summary
+        return "".join(parts)
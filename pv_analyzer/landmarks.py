@@ -0,0 +1,139 @@
+"""
+Landmark Storage Module
+Stores per-frame pose landmarks as contiguous NumPy arrays (struct-of-arrays)
+"""
+
+import numpy as np
+from typing import Dict, List, Optional
+
+
+# Key landmarks for pole vault analysis, in storage order
+LANDMARK_NAMES = (
+    'nose', 'left_shoulder', 'right_shoulder',
+    'left_elbow', 'right_elbow', 'left_wrist', 'right_wrist',
+    'left_hip', 'right_hip', 'left_knee', 'right_knee',
+    'left_ankle', 'right_ankle', 'left_heel', 'right_heel',
+    'left_foot_index', 'right_foot_index'
+)
+
+# Position of each landmark along the landmark axis of LandmarksBuffer.coords
+LANDMARK_INDEX: Dict[str, int] = {name: i for i, name in enumerate(LANDMARK_NAMES)}
+
+# Per-landmark values stored along the last axis of LandmarksBuffer.coords
+LANDMARK_FIELDS = ('x', 'y', 'z', 'visibility')
+
+_MISSING_LANDMARK = (np.nan,) * len(LANDMARK_FIELDS)
+
+
+class LandmarksBuffer:
+    """
+    Pose landmarks for a sequence of frames
+
+    Attributes:
+        coords: float32 array of shape (num_frames, len(LANDMARK_NAMES), 4)
+                holding (x, y, z, visibility) per landmark; NaN where missing
+        valid: Boolean array of shape (num_frames,) marking frames in which
+               a pose was detected
+    """
+
+    def __init__(self, coords: np.ndarray, valid: np.ndarray):
+        self.coords = coords
+        self.valid = valid
+
+    @classmethod
+    def from_dict_list(cls, landmarks_list: List[Optional[dict]]) -> 'LandmarksBuffer':
+        """
+        Build a buffer from per-frame landmark dictionaries
+
+        Args:
+            landmarks_list: List of landmark dictionaries (or None for frames
+                            without a detected pose), as produced by
+                            VideoProcessor
+
+        Returns:
+            LandmarksBuffer holding the same data
+        """
+        num_frames = len(landmarks_list)
+        coords = np.full((num_frames, len(LANDMARK_NAMES), len(LANDMARK_FIELDS)),
+                         np.nan, dtype=np.float32)
+        valid = np.zeros(num_frames, dtype=bool)
+
+        for i, landmarks in enumerate(landmarks_list):
+            if landmarks is None:
+                continue
+            coords[i] = [
+                (lm['x'], lm['y'], lm['z'], lm['visibility']) if lm is not None else _MISSING_LANDMARK
+                for lm in map(landmarks.get, LANDMARK_NAMES)
+            ]
+            valid[i] = True
+
+        return cls(coords, valid)
+
+    @classmethod
+    def from_arrays(cls, rows: List[Optional[np.ndarray]]) -> 'LandmarksBuffer':
+        """
+        Build a buffer from per-frame landmark arrays
+
+        Args:
+            rows: List of arrays of shape (len(LANDMARK_NAMES), 4) holding
+                  (x, y, z, visibility) per landmark (or None for frames
+                  without a detected pose)
+
+        Returns:
+            LandmarksBuffer holding the same data
+        """
+        valid = np.array([row is not None for row in rows], dtype=bool)
+        coords = np.full((len(rows), len(LANDMARK_NAMES), len(LANDMARK_FIELDS)),
+                         np.nan, dtype=np.float32)
+        if valid.any():
+            coords[valid] = [row for row in rows if row is not None]
+
+        return cls(coords, valid)
+
+    def interpolate_gaps(self, max_gap: int) -> 'LandmarksBuffer':
+        """
+        Fill short runs of frames without landmarks by linear interpolation
+
+        A frame is filled when the nearest frames with landmarks before and
+        after it are at most max_gap frames apart; longer gaps and frames
+        at either end of the sequence stay missing.
+
+        Args:
+            max_gap: Largest distance in frames between the frames on either
+                     side of a run for the run to be filled
+
+        Returns:
+            New LandmarksBuffer in which x, y and z of filled frames are
+            interpolated linearly and visibility is taken from the nearer
+            frame
+        """
+        coords = self.coords.copy()
+        valid = self.valid.copy()
+
+        valid_idx = np.flatnonzero(self.valid)
+        missing_idx = np.flatnonzero(~self.valid)
+
+        # Frames with landmarks on either side of each missing frame
+        after = np.searchsorted(valid_idx, missing_idx)
+        inside = (after > 0) & (after < len(valid_idx))
+        missing_idx, after = missing_idx[inside], after[inside]
+        left, right = valid_idx[after - 1], valid_idx[after]
+
+        short_gap = right - left <= max_gap
+        missing_idx, left, right = missing_idx[short_gap], left[short_gap], right[short_gap]
+
+        weight = ((missing_idx - left) / (right - left)).astype(np.float32)[:, None, None]
+        coords[missing_idx] = (1 - weight) * self.coords[left] + weight * self.coords[right]
+
+        nearest = np.where(weight[:, 0, 0] <= 0.5, left, right)
+        coords[missing_idx, :, 3] = self.coords[nearest, :, 3]
+        valid[missing_idx] = True
+
+        return LandmarksBuffer(coords, valid)
+
+    def __len__(self) -> int:
+        return len(self.valid)
+
+    def __getitem__(self, frames: slice) -> 'LandmarksBuffer':
+        """Return a view of a range of frames"""
+        return LandmarksBuffer(self.coords[frames], self.valid[frames])
@@ -3,9 +3,153 @@ Performance Comparator Module
 Compares athlete performance to Olympic athletes like Mondo Duplantis and Karvalho Manolo
 """
 
-from typing import Dict, List
+import functools
+from typing import Dict, List, Sequence, Tuple
 import numpy as np
 
+from .phase_detector import VaultPhase
+
+
+# Per-phase block of the comparison summary, filled from a phase comparison dict
+_PHASE_COMPARISON_TEMPLATE = (
+    "\n  {name}:\n"
+    "    Your Energy: {athlete_energy:.1f} J\n"
+    "    Reference Energy: {reference_energy:.1f} J\n"
+    "    Performance Ratio: {energy_ratio:.1%}\n"
+    "    Performance Level: {performance_level}\n"
+    "    Your Duration: {athlete_duration:.2f}s\n"
+    "    Optimal Duration: {reference_duration:.2f}s\n"
+)
+
+# Training suggestions by phase and issue type ('energy', 'duration_long',
+# 'duration_short'), built once at import
+_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
+    'run': {
+        'energy': "Focus on building running speed and acceleration. Increase sprint training and plyometrics.",
+        'duration_long': "Work on stride efficiency and faster approach rhythm.",
+        'duration_short': "Extend your approach run to build more speed."
+    },
+    'plant': {
+        'energy': "Improve pole plant technique. Practice driving the pole into the box with more force.",
+        'duration_long': "Speed up the plant motion. This should be quick and explosive.",
+        'duration_short': "Ensure proper pole plant depth and angle for better energy transfer."
+    },
+    'take-off': {
+        'energy': "Strengthen take-off leg. Do box jumps and single-leg plyometrics.",
+        'duration_long': "Make take-off more explosive. Focus on quick ground contact.",
+        'duration_short': "Ensure complete leg extension during take-off."
+    },
+    'swing-up': {
+        'energy': "Work on core strength and hip drive. Practice swing drills on low bars.",
+        'duration_long': "Increase swing speed through better core engagement.",
+        'duration_short': "Allow more time for complete swing to maximize height."
+    },
+    'extension/inversion': {
+        'energy': "Strengthen upper body and core. Practice rope climbs and inverted exercises.",
+        'duration_long': "Speed up inversion through better timing and coordination.",
+        'duration_short': "Ensure full inversion for maximum pole energy utilization."
+    },
+    'push-off': {
+        'energy': "Increase arm and shoulder strength. Practice handstand push-ups.",
+        'duration_long': "Make push-off more explosive and quick.",
+        'duration_short': "Ensure complete arm extension during push-off."
+    },
+    'pike': {
+        'energy': "Work on bar clearance technique and body awareness.",
+        'duration_long': "Speed up pike motion for faster bar clearance.",
+        'duration_short': "Allow proper time for pike positioning over the bar."
+    }
+}
+
+_NO_RECOMMENDATIONS: Dict[str, str] = {}
+_DEFAULT_RECOMMENDATION = "Continue training this phase."
+
+# Canonical phase order of the flattened reference arrays
+PHASE_NAMES = tuple(phase.value for phase in VaultPhase)
+_PHASE_INDEX = {name: i for i, name in enumerate(PHASE_NAMES)}
+
+
+def _reference_key(reference_athletes: Dict) -> Tuple:
+    """
+    Extract the reference data used in comparisons as a hashable key
+    
+    Args:
+        reference_athletes: Reference athlete data keyed by athlete id
+        
+    Returns:
+        Tuple with (athlete id, name, mass, phases) per reference athlete,
+        where phases holds (phase name, energy generated, optimal duration)
+        for each phase in PHASE_NAMES
+    """
+    return tuple(
+        (ref_key, ref_data['name'], ref_data['mass'], tuple(
+            (name, phase['energy_generated'], phase['optimal_duration'])
+            for name, phase in ref_data['phase_energies'].items()
+            if name in _PHASE_INDEX
+        ))
+        for ref_key, ref_data in reference_athletes.items()
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _build_reference_arrays(reference_key: Tuple) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Flatten reference phase data into arrays ordered like PHASE_NAMES
+    
+    The arrays are cached, so they are only rebuilt when the reference
+    data changes.
+    
+    Args:
+        reference_key: Reference data as returned by _reference_key
+        
+    Returns:
+        Dictionary mapping athlete id to read-only 'energy_generated' and
+        'optimal_duration' arrays; phases missing for an athlete are NaN
+    """
+    reference_arrays = {}
+    
+    for ref_key, _, _, phases in reference_key:
+        energy_generated = np.full(len(PHASE_NAMES), np.nan)
+        optimal_duration = np.full(len(PHASE_NAMES), np.nan)
+        for name, energy, duration in phases:
+            energy_generated[_PHASE_INDEX[name]] = energy
+            optimal_duration[_PHASE_INDEX[name]] = duration
+        
+        energy_generated.flags.writeable = False
+        optimal_duration.flags.writeable = False
+        reference_arrays[ref_key] = {
+            'energy_generated': energy_generated,
+            'optimal_duration': optimal_duration
+        }
+    
+    return reference_arrays
+
+
+def _build_athlete_arrays(athlete_energies_batch: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Stack athletes' phase data into arrays ordered like PHASE_NAMES
+    
+    Args:
+        athlete_energies_batch: Dictionary of energy data by phase for each
+                                athlete
+        
+    Returns:
+        Dictionary with 'energy_generated' and 'duration' arrays of shape
+        (num_athletes, len(PHASE_NAMES)); phases missing for an athlete are NaN
+    """
+    shape = (len(athlete_energies_batch), len(PHASE_NAMES))
+    athlete_arrays = {field: np.full(shape, np.nan) for field in ('energy_generated', 'duration')}
+    
+    for i, athlete_energies in enumerate(athlete_energies_batch):
+        for phase_name, energies in athlete_energies.items():
+            j = _PHASE_INDEX.get(phase_name)
+            if j is None:
+                continue
+            for field, values in athlete_arrays.items():
+                values[i, j] = energies[field]
+    
+    return athlete_arrays
+
 
 class PerformanceComparator:
     """Compare athlete performance against elite vaulters"""
@@ -101,6 +245,10 @@ class PerformanceComparator:
         }
     }
     
+    # Energy ratio thresholds separating the performance levels below
+    _PERFORMANCE_THRESHOLDS = np.array([0.75, 0.85, 0.95])
+    _PERFORMANCE_LABELS = ('Needs Improvement', 'Fair', 'Good', 'Excellent')
+    
     def __init__(self):
         self.comparisons = {}
         
@@ -115,32 +263,158 @@ class PerformanceComparator:
         Returns:
             Dictionary containing comparison results
         """
-        comparisons = {}
+        # Only the fields used by the comparison identify the result, so
+        # repeated calls with the same performance reuse the cached one
+        energies_key = tuple(
+            (phase_name, float(energies['energy_generated']), float(energies['duration']))
+            for phase_name, energies in athlete_energies.items()
+            if phase_name in _PHASE_INDEX
+        )
+        settings_key = (
+            _reference_key(self.REFERENCE_ATHLETES),
+            tuple(self._PERFORMANCE_THRESHOLDS.tolist()),
+            self._PERFORMANCE_LABELS
+        )
         
-        for ref_name, ref_data in self.REFERENCE_ATHLETES.items():
-            comparison = self._compare_to_reference(
-                athlete_energies, 
-                ref_data['phase_energies'],
-                athlete_mass,
-                ref_data['mass'],
-                ref_data['name']
-            )
-            comparisons[ref_name] = comparison
+        compare_cached = self.__dict__.get('_compare_cached')
+        if compare_cached is None:
+            compare_cached = self._compare_cached = functools.lru_cache(maxsize=256)(self._compare_one)
+        cached = compare_cached(energies_key, float(athlete_mass), settings_key)
+        
+        # Copy so callers may modify the result without changing the cache
+        comparisons = {
+            ref_name: {
+                **comparison,
+                'phase_comparisons': {
+                    phase_name: dict(phase_comp)
+                    for phase_name, phase_comp in comparison['phase_comparisons'].items()
+                },
+                'recommendations': [dict(rec) for rec in comparison['recommendations']]
+            }
+            for ref_name, comparison in cached.items()
+        }
         
         self.comparisons = comparisons
         return comparisons
     
-    def _compare_to_reference(self, athlete_energies: Dict, reference_energies: Dict,
-                             athlete_mass: float, reference_mass: float, 
-                             reference_name: str) -> Dict:
+    def _compare_one(self, energies_key: Tuple[Tuple[str, float, float], ...], athlete_mass: float,
+                     settings_key: Tuple) -> Dict:
         """
-        Compare athlete to a single reference athlete
+        Compare one athlete to reference athletes, memoized per comparator
+        by compare_performance
         
         Args:
-            athlete_energies: Athlete's phase energies
-            reference_energies: Reference athlete's phase energies
-            athlete_mass: Athlete's mass
+            energies_key: (phase name, energy generated, duration) per phase,
+                          in the athlete's phase order
+            athlete_mass: Mass of the athlete in kg
+            settings_key: Reference data and performance thresholds the
+                          result depends on; only part of the cache key
+            
+        Returns:
+            Comparison results shared with later calls; do not modify
+        """
+        athlete_energies = {
+            phase_name: {'energy_generated': energy_generated, 'duration': duration}
+            for phase_name, energy_generated, duration in energies_key
+        }
+        return self.compare_performance_batch([athlete_energies], [athlete_mass])[0]
+    
+    def compare_performance_batch(self, athlete_energies_batch: List[Dict],
+                                  athlete_masses: Sequence[float]) -> List[Dict]:
+        """
+        Compare several athletes to reference athletes at once
+        
+        Args:
+            athlete_energies_batch: Dictionary of energy data by phase for
+                                    each athlete
+            athlete_masses: Mass of each athlete in kg
+            
+        Returns:
+            List with one comparison result per athlete, each shaped like the
+            result of compare_performance
+        """
+        masses = np.asarray(athlete_masses, dtype=float)
+        if masses.shape != (len(athlete_energies_batch),):
+            raise ValueError("Expected one mass per athlete")
+        
+        athlete_arrays = _build_athlete_arrays(athlete_energies_batch)
+        reference_arrays = _build_reference_arrays(_reference_key(self.REFERENCE_ATHLETES))
+        batch_comparisons = [{} for _ in athlete_energies_batch]
+        
+        for ref_name, ref_data in self.REFERENCE_ATHLETES.items():
+            metrics = self._compare_to_reference(
+                athlete_arrays,
+                reference_arrays[ref_name],
+                masses,
+                ref_data['mass']
+            )
+            
+            for i, athlete_energies in enumerate(athlete_energies_batch):
+                batch_comparisons[i][ref_name] = self._build_comparison(
+                    athlete_energies,
+                    {field: values[i] for field, values in metrics.items()},
+                    ref_data['name']
+                )
+        
+        return batch_comparisons
+    
+    def _compare_to_reference(self, athlete_arrays: Dict[str, np.ndarray],
+                             reference_arrays: Dict[str, np.ndarray],
+                             athlete_masses: np.ndarray, reference_mass: float) -> Dict[str, np.ndarray]:
+        """
+        Compare all athletes to a single reference athlete
+        
+        Args:
+            athlete_arrays: Athletes' stacked phase data (see
+                            _build_athlete_arrays)
+            reference_arrays: Reference athlete's flattened phase data
+                              (see _build_reference_arrays)
+            athlete_masses: Array of athlete masses of shape (num_athletes,)
             reference_mass: Reference athlete's mass
+            
+        Returns:
+            Dictionary of per-athlete, per-phase metric arrays of shape
+            (num_athletes, len(PHASE_NAMES)), plus 'overall_score' of shape
+            (num_athletes,)
+        """
+        athlete_energy = athlete_arrays['energy_generated']
+        athlete_duration = athlete_arrays['duration']
+        
+        # Adjust for mass difference (energy scales with mass)
+        mass_factor = athlete_masses[:, None] / reference_mass
+        reference_energy = reference_arrays['energy_generated'] * mass_factor
+        reference_duration = np.broadcast_to(reference_arrays['optimal_duration'], athlete_energy.shape)
+        
+        # Phases present for both athlete and reference
+        compared = ~(np.isnan(athlete_energy) | np.isnan(reference_energy))
+        
+        # Compare key metrics for all athletes and phases at once
+        energy_diff = athlete_energy - reference_energy
+        energy_ratio = np.divide(athlete_energy, reference_energy,
+                                 out=np.zeros_like(athlete_energy), where=reference_energy != 0)
+        duration_diff = athlete_duration - reference_duration
+        
+        return {
+            'compared': compared,
+            'athlete_energy': athlete_energy,
+            'reference_energy': reference_energy,
+            'energy_difference': energy_diff,
+            'energy_ratio': energy_ratio,
+            'athlete_duration': athlete_duration,
+            'reference_duration': reference_duration,
+            'duration_difference': duration_diff,
+            'performance_level': np.digitize(energy_ratio, self._PERFORMANCE_THRESHOLDS),
+            'overall_score': self._calculate_overall_scores(energy_ratio, compared)
+        }
+    
+    def _build_comparison(self, athlete_energies: Dict, metrics: Dict[str, np.ndarray],
+                          reference_name: str) -> Dict:
+        """
+        Build the comparison result of one athlete against one reference
+        
+        Args:
+            athlete_energies: Athlete's phase energies
+            metrics: The athlete's row of the metrics from _compare_to_reference
             reference_name: Name of reference athlete
             
         Returns:
@@ -149,63 +423,46 @@ class PerformanceComparator:
         phase_comparisons = {}
         recommendations = []
         
-        for phase_name in athlete_energies.keys():
-            if phase_name not in reference_energies:
+        # Phases present for both athlete and reference, in the athlete's order
+        for phase_name in athlete_energies:
+            j = _PHASE_INDEX.get(phase_name)
+            if j is None or not metrics['compared'][j]:
                 continue
             
-            athlete_phase = athlete_energies[phase_name]
-            ref_phase = reference_energies[phase_name]
-            
-            # Adjust for mass difference (energy scales with mass)
-            mass_factor = athlete_mass / reference_mass
-            
-            # Compare key metrics
-            energy_diff = athlete_phase['energy_generated'] - (ref_phase['energy_generated'] * mass_factor)
-            energy_ratio = (athlete_phase['energy_generated'] / (ref_phase['energy_generated'] * mass_factor) 
-                          if ref_phase['energy_generated'] * mass_factor != 0 else 0)
-            
-            duration_diff = athlete_phase['duration'] - ref_phase['optimal_duration']
-            
-            # Determine performance level
-            if energy_ratio >= 0.95:
-                performance = "Excellent"
-            elif energy_ratio >= 0.85:
-                performance = "Good"
-            elif energy_ratio >= 0.75:
-                performance = "Fair"
-            else:
-                performance = "Needs Improvement"
+            ratio = float(metrics['energy_ratio'][j])
+            phase_duration_diff = float(metrics['duration_difference'][j])
+            performance = self._PERFORMANCE_LABELS[metrics['performance_level'][j]]
             
             phase_comparisons[phase_name] = {
-                'athlete_energy': athlete_phase['energy_generated'],
-                'reference_energy': ref_phase['energy_generated'] * mass_factor,
-                'energy_difference': energy_diff,
-                'energy_ratio': energy_ratio,
-                'athlete_duration': athlete_phase['duration'],
-                'reference_duration': ref_phase['optimal_duration'],
-                'duration_difference': duration_diff,
+                'athlete_energy': float(metrics['athlete_energy'][j]),
+                'reference_energy': float(metrics['reference_energy'][j]),
+                'energy_difference': float(metrics['energy_difference'][j]),
+                'energy_ratio': ratio,
+                'athlete_duration': float(metrics['athlete_duration'][j]),
+                'reference_duration': float(metrics['reference_duration'][j]),
+                'duration_difference': phase_duration_diff,
                 'performance_level': performance
             }
             
             # Generate recommendations
-            if energy_ratio < 0.85:
+            if ratio < 0.85:
                 recommendations.append({
                     'phase': phase_name,
-                    'issue': f"Energy generation is {(1-energy_ratio)*100:.1f}% below optimal",
+                    'issue': f"Energy generation is {(1-ratio)*100:.1f}% below optimal",
                     'suggestion': self._get_phase_recommendation(phase_name, 'energy')
                 })
             
-            if abs(duration_diff) > 0.2:
-                if duration_diff > 0:
+            if abs(phase_duration_diff) > 0.2:
+                if phase_duration_diff > 0:
                     recommendations.append({
                         'phase': phase_name,
-                        'issue': f"Phase duration is {duration_diff:.2f}s too long",
+                        'issue': f"Phase duration is {phase_duration_diff:.2f}s too long",
                         'suggestion': self._get_phase_recommendation(phase_name, 'duration_long')
                     })
                 else:
                     recommendations.append({
                         'phase': phase_name,
-                        'issue': f"Phase duration is {abs(duration_diff):.2f}s too short",
+                        'issue': f"Phase duration is {abs(phase_duration_diff):.2f}s too short",
                         'suggestion': self._get_phase_recommendation(phase_name, 'duration_short')
                     })
         
@@ -213,97 +470,49 @@ class PerformanceComparator:
             'reference_name': reference_name,
             'phase_comparisons': phase_comparisons,
             'recommendations': recommendations,
-            'overall_score': self._calculate_overall_score(phase_comparisons)
+            'overall_score': float(metrics['overall_score'])
         }
     
-    def _calculate_overall_score(self, phase_comparisons: Dict) -> float:
-        """Calculate overall performance score (0-100)"""
-        if not phase_comparisons:
-            return 0.0
-        
-        scores = []
-        for phase_data in phase_comparisons.values():
-            # Score based on energy ratio (capped at 100%)
-            energy_score = min(phase_data['energy_ratio'] * 100, 100)
-            scores.append(energy_score)
+    def _calculate_overall_scores(self, energy_ratios: np.ndarray, compared: np.ndarray) -> np.ndarray:
+        """Calculate overall performance score (0-100) of each athlete over the compared phases"""
+        # Score based on energy ratio (capped at 100%)
+        capped = np.where(compared, np.minimum(energy_ratios * 100, 100), 0.0)
+        num_compared = compared.sum(axis=1)
         
-        return np.mean(scores)
+        return np.divide(capped.sum(axis=1), num_compared,
+                         out=np.zeros(len(num_compared)), where=num_compared > 0)
     
     def _get_phase_recommendation(self, phase_name: str, issue_type: str) -> str:
         """Get specific recommendations for phase improvement"""
-        recommendations = {
-            'run': {
-                'energy': "Focus on building running speed and acceleration. Increase sprint training and plyometrics.",
-                'duration_long': "Work on stride efficiency and faster approach rhythm.",
-                'duration_short': "Extend your approach run to build more speed."
-            },
-            'plant': {
-                'energy': "Improve pole plant technique. Practice driving the pole into the box with more force.",
-                'duration_long': "Speed up the plant motion. This should be quick and explosive.",
-                'duration_short': "Ensure proper pole plant depth and angle for better energy transfer."
-            },
-            'take-off': {
-                'energy': "Strengthen take-off leg. Do box jumps and single-leg plyometrics.",
-                'duration_long': "Make take-off more explosive. Focus on quick ground contact.",
-                'duration_short': "Ensure complete leg extension during take-off."
-            },
-            'swing-up': {
-                'energy': "Work on core strength and hip drive. Practice swing drills on low bars.",
-                'duration_long': "Increase swing speed through better core engagement.",
-                'duration_short': "Allow more time for complete swing to maximize height."
-            },
-            'extension/inversion': {
-                'energy': "Strengthen upper body and core. Practice rope climbs and inverted exercises.",
-                'duration_long': "Speed up inversion through better timing and coordination.",
-                'duration_short': "Ensure full inversion for maximum pole energy utilization."
-            },
-            'push-off': {
-                'energy': "Increase arm and shoulder strength. Practice handstand push-ups.",
-                'duration_long': "Make push-off more explosive and quick.",
-                'duration_short': "Ensure complete arm extension during push-off."
-            },
-            'pike': {
-                'energy': "Work on bar clearance technique and body awareness.",
-                'duration_long': "Speed up pike motion for faster bar clearance.",
-                'duration_short': "Allow proper time for pike positioning over the bar."
-            }
-        }
-        
-        return recommendations.get(phase_name, {}).get(issue_type, "Continue training this phase.")
+        return _RECOMMENDATIONS.get(phase_name, _NO_RECOMMENDATIONS).get(issue_type, _DEFAULT_RECOMMENDATION)
     
     def get_comparison_summary(self) -> str:
         """Generate a text summary of performance comparisons"""
         if not self.comparisons:
             return "No comparisons available"
         
-        summary = "\n" + "=" * 80 + "\n"
-        summary += "PERFORMANCE COMPARISON TO OLYMPIC ATHLETES\n"
-        summary += "=" * 80 + "\n\n"
+        parts = ["\n" + "=" * 80 + "\n"]
+        parts.append("PERFORMANCE COMPARISON TO OLYMPIC ATHLETES\n")
+        parts.append("=" * 80 + "\n\n")
         
         for ref_key, comparison in self.comparisons.items():
-            summary += f"Comparison to {comparison['reference_name']}:\n"
-            summary += f"Overall Score: {comparison['overall_score']:.1f}/100\n"
-            summary += "-" * 80 + "\n\n"
+            parts.append(f"Comparison to {comparison['reference_name']}:\n")
+            parts.append(f"Overall Score: {comparison['overall_score']:.1f}/100\n")
+            parts.append("-" * 80 + "\n\n")
             
-            summary += "Phase-by-Phase Comparison:\n"
+            parts.append("Phase-by-Phase Comparison:\n")
             for phase_name, phase_comp in comparison['phase_comparisons'].items():
-                summary += f"\n  {phase_name.upper()}:\n"
-                summary += f"    Your Energy: {phase_comp['athlete_energy']:.1f} J\n"
-                summary += f"    Reference Energy: {phase_comp['reference_energy']:.1f} J\n"
-                summary += f"    Performance Ratio: {phase_comp['energy_ratio']*100:.1f}%\n"
-                summary += f"    Performance Level: {phase_comp['performance_level']}\n"
-                summary += f"    Your Duration: {phase_comp['athlete_duration']:.2f}s\n"
-                summary += f"    Optimal Duration: {phase_comp['reference_duration']:.2f}s\n"
+                parts.append(_PHASE_COMPARISON_TEMPLATE.format_map({**phase_comp, 'name': phase_name.upper()}))
             
             if comparison['recommendations']:
-                summary += "\n  RECOMMENDATIONS FOR IMPROVEMENT:\n"
-                summary += "  " + "-" * 76 + "\n"
+                parts.append("\n  RECOMMENDATIONS FOR IMPROVEMENT:\n")
+                parts.append("  " + "-" * 76 + "\n")
                 for i, rec in enumerate(comparison['recommendations'], 1):
-                    summary += f"  {i}. {rec['phase'].upper()}: {rec['issue']}\n"
-                    summary += f"     → {rec['suggestion']}\n\n"
+                    parts.append(f"  {i}. {rec['phase'].upper()}: {rec['issue']}\n")
+                    parts.append(f"     → {rec['suggestion']}\n\n")
             else:
-                summary += "\n  Excellent performance! Keep up the great work!\n"
+                parts.append("\n  Excellent performance! Keep up the great work!\n")
             
-            summary += "\n" + "=" * 80 + "\n\n"
+            parts.append("\n" + "=" * 80 + "\n\n")
         
-        return summary
+        return "".join(parts)
@@ -5,9 +5,11 @@ extension/inversion, push-off, and pike
 """
 
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 from enum import Enum
 
+from .landmarks import LANDMARK_INDEX, LandmarksBuffer
+
 
 class VaultPhase(Enum):
     """Enumeration of pole vault phases"""
@@ -20,18 +22,60 @@ class VaultPhase(Enum):
     PIKE = "pike"
 
 
+# Integer phase codes used internally; a code indexes PHASE_ORDER
+PHASE_ORDER = tuple(VaultPhase)
+(PHASE_RUN, PHASE_PLANT, PHASE_TAKEOFF, PHASE_SWING_UP,
+ PHASE_EXTENSION_INVERSION, PHASE_PUSH_OFF, PHASE_PIKE) = range(len(PHASE_ORDER))
+NO_PHASE = -1  # Frames without landmarks
+
+
+def _rolling_mean(values: np.ndarray, half_window: int) -> np.ndarray:
+    """
+    Mean of each value with up to half_window neighbors on either side
+    
+    Windows are truncated at the ends of the array rather than padded, so
+    each mean covers only real samples.
+    
+    Args:
+        values: Array of shape (N,)
+        half_window: Number of neighbors on each side
+        
+    Returns:
+        Array of shape (N,) of window means
+    """
+    num_values = len(values)
+    csum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    
+    frame_idx = np.arange(num_values)
+    start = np.maximum(frame_idx - half_window, 0)
+    end = np.minimum(frame_idx + half_window + 1, num_values)
+    
+    return (csum[end] - csum[start]) / (end - start)
+
+
 class PhaseDetector:
     """Detect phases of pole vaulting from pose landmarks"""
     
+    # Number of frames on each side of a frame averaged for smoothing
+    _SMOOTHING_WINDOW = 5
+    
+    # Landmarks used by the motion metrics, gathered together in this order
+    _KEY_IDX = np.array([LANDMARK_INDEX[name] for name in (
+        'left_hip', 'right_hip', 'left_shoulder', 'right_shoulder', 'left_ankle', 'right_ankle'
+    )])
+    
     def __init__(self):
         self.phases = []
+        self.phase_codes = np.zeros(0, dtype=np.int8)
         
-    def detect_phases(self, landmarks_list: List[Optional[dict]], video_info: dict) -> List[Dict]:
+    def detect_phases(self, landmarks_list: Union[List[Optional[dict]], LandmarksBuffer],
+                      video_info: dict) -> List[Dict]:
         """
         Detect pole vault phases from landmark data
         
         Args:
-            landmarks_list: List of landmark dictionaries for each frame
+            landmarks_list: List of landmark dictionaries for each frame, or
+                            a LandmarksBuffer holding the same data
             video_info: Video metadata including fps
             
         Returns:
@@ -43,182 +87,154 @@ class PhaseDetector:
         fps = video_info['fps']
         phases = []
         
+        # Convert to contiguous arrays once for the metric calculations
+        if isinstance(landmarks_list, LandmarksBuffer):
+            landmarks = landmarks_list
+        else:
+            landmarks = LandmarksBuffer.from_dict_list(landmarks_list)
+        
         # Calculate metrics for each frame
-        velocities = self._calculate_velocities(landmarks_list, fps)
-        heights = self._calculate_heights(landmarks_list)
-        body_angles = self._calculate_body_angles(landmarks_list)
-        
-        # Detect phases based on motion characteristics
-        current_phase = None
-        phase_start = 0
-        
-        for frame_idx in range(len(landmarks_list)):
-            if landmarks_list[frame_idx] is None:
-                continue
-                
-            detected_phase = self._identify_phase(
-                frame_idx, landmarks_list, velocities, heights, body_angles
-            )
-            
-            if detected_phase != current_phase:
-                if current_phase is not None:
-                    phases.append({
-                        'phase': current_phase,
-                        'start_frame': phase_start,
-                        'end_frame': frame_idx - 1,
-                        'duration': (frame_idx - phase_start) / fps
-                    })
-                current_phase = detected_phase
-                phase_start = frame_idx
-        
-        # Add final phase
-        if current_phase is not None:
+        velocities, heights, body_angles = self._compute_metrics(landmarks, fps)
+        
+        # Smooth each metric over a window around every frame
+        avg_velocities = _rolling_mean(velocities, self._SMOOTHING_WINDOW)
+        avg_heights = _rolling_mean(heights, self._SMOOTHING_WINDOW)
+        avg_angles = _rolling_mean(body_angles, self._SMOOTHING_WINDOW)
+        
+        # Classify each frame with landmarks based on motion characteristics
+        phase_codes = np.where(
+            landmarks.valid, self._classify_all(avg_velocities, avg_heights, avg_angles), NO_PHASE
+        ).astype(np.int8)
+        
+        # Phases start wherever the code changes between consecutive frames
+        # with landmarks; frames without landmarks belong to the phase before
+        # them, and any before the first classified frame to no phase
+        classified_idx = np.flatnonzero(phase_codes != NO_PHASE)
+        classified_codes = phase_codes[classified_idx]
+        first = np.flatnonzero(np.diff(classified_codes, prepend=NO_PHASE))
+        
+        starts = classified_idx[first]
+        ends = np.append(starts[1:], len(phase_codes))
+        
+        for start, end, code in zip(starts.tolist(), ends.tolist(), classified_codes[first].tolist()):
             phases.append({
-                'phase': current_phase,
-                'start_frame': phase_start,
-                'end_frame': len(landmarks_list) - 1,
-                'duration': (len(landmarks_list) - phase_start) / fps
+                'phase': PHASE_ORDER[code],
+                'start_frame': start,
+                'end_frame': end - 1,
+                'duration': (end - start) / fps
             })
         
         self.phases = phases
+        self.phase_codes = phase_codes
         return phases
     
-    def _calculate_velocities(self, landmarks_list: List[Optional[dict]], fps: float) -> List[float]:
-        """Calculate horizontal velocity of the center of mass"""
-        velocities = []
-        
-        for i in range(len(landmarks_list)):
-            if landmarks_list[i] is None:
-                velocities.append(0.0)
-                continue
-                
-            if i == 0 or landmarks_list[i-1] is None:
-                velocities.append(0.0)
-                continue
-            
-            # Calculate center of mass position
-            com_x_curr = self._get_center_of_mass_x(landmarks_list[i])
-            com_x_prev = self._get_center_of_mass_x(landmarks_list[i-1])
-            
-            # Velocity in pixels per second
-            velocity = (com_x_curr - com_x_prev) * fps
-            velocities.append(velocity)
+    def _compute_metrics(self, landmarks: LandmarksBuffer,
+                         fps: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Calculate velocity, height and body angle for each frame
         
-        return velocities
-    
-    def _calculate_heights(self, landmarks_list: List[Optional[dict]]) -> List[float]:
-        """Calculate height of center of mass from ground"""
-        heights = []
-        
-        for landmarks in landmarks_list:
-            if landmarks is None:
-                heights.append(0.0)
-                continue
-            
-            # Use average of hip height as proxy for COM height
-            left_hip_y = landmarks['left_hip']['y']
-            right_hip_y = landmarks['right_hip']['y']
-            com_y = (left_hip_y + right_hip_y) / 2
-            
-            # Get foot position as ground reference
-            left_foot_y = landmarks['left_ankle']['y']
-            right_foot_y = landmarks['right_ankle']['y']
-            ground_y = max(left_foot_y, right_foot_y)  # Lower foot position
-            
-            height = ground_y - com_y  # Invert because y increases downward
-            heights.append(height)
+        All three metrics are derived from a single gather of the hip,
+        shoulder and ankle coordinates.
         
-        return heights
-    
-    def _calculate_body_angles(self, landmarks_list: List[Optional[dict]]) -> List[float]:
-        """Calculate body angle relative to horizontal"""
-        angles = []
-        
-        for landmarks in landmarks_list:
-            if landmarks is None:
-                angles.append(0.0)
-                continue
-            
-            # Calculate angle between shoulders and hips
-            shoulder_x = (landmarks['left_shoulder']['x'] + landmarks['right_shoulder']['x']) / 2
-            shoulder_y = (landmarks['left_shoulder']['y'] + landmarks['right_shoulder']['y']) / 2
-            hip_x = (landmarks['left_hip']['x'] + landmarks['right_hip']['x']) / 2
-            hip_y = (landmarks['left_hip']['y'] + landmarks['right_hip']['y']) / 2
-            
-            dx = hip_x - shoulder_x
-            dy = hip_y - shoulder_y
+        Args:
+            landmarks: Landmarks for every frame
+            fps: Frames per second
             
-            angle = np.arctan2(dy, dx) * 180 / np.pi
-            angles.append(angle)
-        
-        return angles
-    
-    def _get_center_of_mass_x(self, landmarks: dict) -> float:
-        """Calculate x-coordinate of center of mass"""
-        key_points = ['left_hip', 'right_hip', 'left_shoulder', 'right_shoulder']
-        x_sum = sum(landmarks[point]['x'] for point in key_points)
-        return x_sum / len(key_points)
-    
-    def _identify_phase(self, frame_idx: int, landmarks_list: List[Optional[dict]], 
-                       velocities: List[float], heights: List[float], 
-                       body_angles: List[float]) -> VaultPhase:
-        """
-        Identify the current phase based on motion characteristics
-        
-        Uses heuristics based on velocity, height, and body angle
+        Returns:
+            Tuple of (velocities, heights, body_angles) arrays of shape (N,);
+            frames without landmarks are 0 in each
         """
-        velocity = velocities[frame_idx]
-        height = heights[frame_idx]
-        angle = body_angles[frame_idx]
+        key = landmarks.coords[:, self._KEY_IDX, :2]
+        valid = landmarks.valid
         
-        # Create a window for smoothing
-        window_size = 5
-        start_idx = max(0, frame_idx - window_size)
-        end_idx = min(len(velocities), frame_idx + window_size + 1)
+        hip = key[:, 0:2].mean(axis=1)
+        shoulder = key[:, 2:4].mean(axis=1)
         
-        avg_velocity = np.mean(velocities[start_idx:end_idx])
-        avg_height = np.mean(heights[start_idx:end_idx])
-        avg_angle = np.mean(body_angles[start_idx:end_idx])
+        # Horizontal velocity of the center of mass (hips and shoulders)
+        com_x = (hip[:, 0] + shoulder[:, 0]) * 0.5
+        velocities = self._calculate_velocities(com_x, valid, fps)
         
-        # Phase detection logic
-        # 1. RUN: High horizontal velocity, low height, body relatively upright
-        if avg_velocity > 50 and avg_height < 150 and abs(avg_angle) < 30:
-            return VaultPhase.RUN
+        # Height of the hips (proxy for COM height) above the lower foot;
+        # inverted because y increases downward
+        ground_y = key[:, 4:6, 1].max(axis=1)
+        heights = np.where(valid, ground_y - hip[:, 1], 0.0)
         
-        # 2. PLANT: Velocity decreasing, height starting to increase
-        if 20 < avg_velocity < 50 and 100 < avg_height < 200:
-            return VaultPhase.PLANT
+        # Body angle relative to horizontal, from shoulders to hips
+        body = hip - shoulder
+        body_angles = np.where(valid, np.degrees(np.arctan2(body[:, 1], body[:, 0])), 0.0)
         
-        # 3. TAKEOFF: Rapid height increase, velocity still moderate
-        if avg_velocity > 0 and 150 < avg_height < 300 and abs(avg_angle) < 60:
-            return VaultPhase.TAKEOFF
+        return velocities, heights, body_angles
+    
+    def _calculate_velocities(self, com_x: np.ndarray, valid: np.ndarray, fps: float) -> np.ndarray:
+        """Calculate horizontal velocity of the center of mass"""
+        # Velocity in pixels per second from the previous frame, only between
+        # consecutive frames that both have landmarks (the first frame has
+        # no previous one)
+        velocities = np.zeros(len(com_x), dtype=com_x.dtype)
+        velocities[1:] = np.where(valid[1:] & valid[:-1], np.diff(com_x) * fps, 0.0)
+        
+        # Where the two frames on each side also have landmarks, use the
+        # fourth-order central difference, which is far less sensitive to
+        # pose jitter: (P[t-2] - 8 P[t-1] + 8 P[t+1] - P[t+2]) / 12
+        central = (com_x[:-4] - 8 * com_x[1:-3] + 8 * com_x[3:-1] - com_x[4:]) * (fps / 12)
+        central_valid = valid[:-4] & valid[1:-3] & valid[2:-2] & valid[3:-1] & valid[4:]
+        velocities[2:-2] = np.where(central_valid, central, velocities[2:-2])
         
-        # 4. SWING_UP: Body rotating, height increasing rapidly
-        if avg_height > 200 and 30 < abs(avg_angle) < 90:
-            return VaultPhase.SWING_UP
+        return velocities
+    
+    def _classify_all(self, avg_velocity: np.ndarray, avg_height: np.ndarray,
+                      avg_angle: np.ndarray) -> np.ndarray:
+        """
+        Identify the phase of every frame based on motion characteristics
         
-        # 5. EXTENSION_INVERSION: Body inverted (angle > 90), at peak height
-        if avg_height > 250 and abs(avg_angle) > 80:
-            return VaultPhase.EXTENSION_INVERSION
+        Uses heuristics based on velocity, height, and body angle, each
+        smoothed over a window around the frame. Rules are checked in order
+        and the first one that matches decides the phase.
         
-        # 6. PUSH_OFF: Height at maximum, body starting to extend
-        if avg_height > 300 and 45 < abs(avg_angle) < 90:
-            return VaultPhase.PUSH_OFF
+        Args:
+            avg_velocity: Smoothed horizontal velocity per frame
+            avg_height: Smoothed height per frame
+            avg_angle: Smoothed body angle per frame
+            
+        Returns:
+            Array of phase codes (indices into PHASE_ORDER)
+        """
+        abs_angle = np.abs(avg_angle)
         
-        # 7. PIKE: Descending, body folded
-        if avg_height > 200 and abs(avg_angle) < 45:
-            return VaultPhase.PIKE
+        # Phase detection logic
+        rules = [
+            # 1. RUN: High horizontal velocity, low height, body relatively upright
+            (PHASE_RUN, (avg_velocity > 50) & (avg_height < 150) & (abs_angle < 30)),
+            
+            # 2. PLANT: Velocity decreasing, height starting to increase
+            (PHASE_PLANT, (20 < avg_velocity) & (avg_velocity < 50) & (100 < avg_height) & (avg_height < 200)),
+            
+            # 3. TAKEOFF: Rapid height increase, velocity still moderate
+            (PHASE_TAKEOFF, (avg_velocity > 0) & (150 < avg_height) & (avg_height < 300) & (abs_angle < 60)),
+            
+            # 4. SWING_UP: Body rotating, height increasing rapidly
+            (PHASE_SWING_UP, (avg_height > 200) & (30 < abs_angle) & (abs_angle < 90)),
+            
+            # 5. EXTENSION_INVERSION: Body inverted (angle > 90), at peak height
+            (PHASE_EXTENSION_INVERSION, (avg_height > 250) & (abs_angle > 80)),
+            
+            # 6. PUSH_OFF: Height at maximum, body starting to extend
+            (PHASE_PUSH_OFF, (avg_height > 300) & (45 < abs_angle) & (abs_angle < 90)),
+            
+            # 7. PIKE: Descending, body folded
+            (PHASE_PIKE, (avg_height > 200) & (abs_angle < 45)),
+        ]
         
         # Default to RUN if no other phase detected
-        return VaultPhase.RUN
+        return np.select([condition for _, condition in rules], [code for code, _ in rules],
+                         default=PHASE_RUN)
     
     def get_phase_summary(self) -> str:
         """Get a text summary of detected phases"""
         if not self.phases:
             return "No phases detected"
         
-        summary = "Detected Pole Vault Phases:\n"
-        summary += "=" * 50 + "\n"
+        parts = ["Detected Pole Vault Phases:\n", "=" * 50 + "\n"]
         
         for i, phase_info in enumerate(self.phases, 1):
             phase = phase_info['phase']
@@ -226,8 +242,8 @@ class PhaseDetector:
             start = phase_info['start_frame']
             end = phase_info['end_frame']
             
-            summary += f"{i}. {phase.value.upper()}\n"
-            summary += f"   Frames: {start} - {end}\n"
-            summary += f"   Duration: {duration:.2f} seconds\n\n"
+            parts.append(f"{i}. {phase.value.upper()}\n")
+            parts.append(f"   Frames: {start} - {end}\n")
+            parts.append(f"   Duration: {duration:.2f} seconds\n\n")
         
-        return summary
+        return "".join(parts)
@@ -3,40 +3,306 @@ Video Processing Module
 Handles video input, frame extraction, and pose estimation
 """
 
+import atexit
+import functools
+import queue
+import threading
+
 import cv2
 import mediapipe as mp
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import Any, Callable, Iterator, List, Tuple, Optional
+
+from .landmarks import LANDMARK_NAMES, LandmarksBuffer
+
+
+def get_pose_model(model_complexity: int = 2, min_detection_confidence: float = 0.5,
+                   min_tracking_confidence: float = 0.5):
+    """
+    Get the process-wide MediaPipe Pose model
+    
+    Loading the model takes hundreds of milliseconds, so it is created on
+    first use and shared by every VideoProcessor created with
+    shared_model=True and the same settings. The model keeps tracking state
+    between frames, so only one video may be processed with it at a time.
+    
+    Args:
+        model_complexity: MediaPipe model complexity (0, 1 or 2)
+        min_detection_confidence: Minimum confidence for person detection
+        min_tracking_confidence: Minimum confidence for landmark tracking
+        
+    Returns:
+        MediaPipe Pose instance
+    """
+    # Always pass every setting, so calls relying on the defaults and calls
+    # spelling them out share the same cache entry
+    return _shared_pose_model(model_complexity, min_detection_confidence, min_tracking_confidence)
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_pose_model(model_complexity: int, min_detection_confidence: float,
+                       min_tracking_confidence: float):
+    """Create the pose model cached by get_pose_model"""
+    return _create_pose_model(model_complexity, min_detection_confidence, min_tracking_confidence)
+
+
+def _create_pose_model(model_complexity: int, min_detection_confidence: float,
+                       min_tracking_confidence: float):
+    """
+    Create a MediaPipe Pose model for video input
+    
+    The model runs in video mode, tracking the pose from the previous frame
+    instead of re-running person detection every frame.
+    """
+    return mp.solutions.pose.Pose(
+        static_image_mode=False,
+        model_complexity=model_complexity,
+        enable_segmentation=False,
+        min_detection_confidence=min_detection_confidence,
+        min_tracking_confidence=min_tracking_confidence
+    )
+
+
+atexit.register(_shared_pose_model.cache_clear)
+
+
+def _read_ahead(cap, max_frames: int, rgb_stride: int = 1,
+                frame_step: int = 1) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray]]]:
+    """
+    Yield the frames of an open capture, decoded on a background thread
+    
+    Up to max_frames frames are decoded and converted to RGB ahead of the
+    consumer, so decoding overlaps with pose estimation on earlier frames.
+    Closing the iterator stops the reader thread before returning, after
+    which the capture is safe to release. An exception raised while
+    reading is re-raised to the consumer after the frames read before it.
+    
+    RGB frames are converted into a small ring of reused, read-only
+    buffers, so each one is only valid until the next item is requested.
+    
+    Args:
+        cap: Open cv2.VideoCapture, read only by the background thread
+        max_frames: Maximum number of decoded frames waiting to be consumed
+        rgb_stride: Convert only every rgb_stride-th yielded frame to RGB
+        frame_step: Yield only every frame_step-th frame of the video; the
+                    frames between are grabbed but never retrieved
+        
+    Returns:
+        Iterator of (BGR frame, RGB frame or None) pairs
+    """
+    frames = queue.Queue(maxsize=max_frames)
+    stop = threading.Event()
+    errors = []
+    
+    # Enough RGB buffers for a full queue, the frame being consumed and the
+    # frame being converted, so a buffer is never overwritten while in use
+    rgb_buffers = []
+    num_rgb_buffers = max_frames + 2
+    
+    def read():
+        try:
+            frame_idx = 0
+            num_converted = 0
+            while not stop.is_set():
+                # Skip frames with grab(), which does not copy them out of the decoder
+                if frame_idx > 0 and not all(cap.grab() for _ in range(frame_step - 1)):
+                    break
+                
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                
+                # Convert BGR to RGB here too, so it also overlaps with pose estimation
+                frame_rgb = None
+                if frame_idx % rgb_stride == 0:
+                    if len(rgb_buffers) < num_rgb_buffers:
+                        rgb_buffers.append(np.empty_like(frame))
+                    frame_rgb = rgb_buffers[num_converted % num_rgb_buffers]
+                    frame_rgb.flags.writeable = True
+                    # cvtColor allocates a new array instead if the frame size changed
+                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame_rgb)
+                    # Read-only input lets MediaPipe use the buffer without copying it
+                    frame_rgb.flags.writeable = False
+                    num_converted += 1
+                frames.put((frame, frame_rgb))
+                frame_idx += 1
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            frames.put(None)  # End of video
+    
+    reader = threading.Thread(target=read, name='video-reader', daemon=True)
+    reader.start()
+    
+    try:
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            yield item
+        
+        if errors:
+            raise errors[0]
+    finally:
+        # Unblock the reader if it is waiting on a full queue, then wait for it
+        stop.set()
+        while reader.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        reader.join()
 
 
 class VideoProcessor:
     """Process pole vault videos and extract pose landmarks"""
     
-    def __init__(self):
+    # Number of frames decoded ahead of pose estimation, limited so the
+    # queued BGR frames and their RGB copies take at most about
+    # _READ_AHEAD_BYTES (2 frames at 4K, 5 at 1080p)
+    _READ_AHEAD_FRAMES = 16
+    _MIN_READ_AHEAD_FRAMES = 2
+    _READ_AHEAD_BYTES = 64 * 1024 * 1024
+    
+    # OpenCV capture backends tried in order when opening a video
+    _VIDEO_BACKENDS = (cv2.CAP_FFMPEG, cv2.CAP_ANY)
+    
+    def __init__(self, model_complexity: int = 2, min_detection_confidence: float = 0.5,
+                 min_tracking_confidence: float = 0.5, shared_model: bool = False):
+        """
+        Initialize the video processor
+        
+        Args:
+            model_complexity: MediaPipe model complexity (0, 1 or 2). Lower
+                              values are faster but less accurate; 0 or 1
+                              suit clean footage with a single athlete
+            min_detection_confidence: Minimum confidence for person detection
+            min_tracking_confidence: Minimum confidence for landmark tracking
+            shared_model: Use the process-wide model from get_pose_model
+                          instead of loading one for this processor. This
+                          saves the model load when processors are created
+                          repeatedly, but the model tracks the pose across
+                          frames, so processors sharing it must not process
+                          videos concurrently or interleave streams
+        """
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=2,
-            enable_segmentation=False,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+        self._shared_model = shared_model
+        if shared_model:
+            self.pose = get_pose_model(model_complexity, min_detection_confidence, min_tracking_confidence)
+        else:
+            self.pose = _create_pose_model(model_complexity, min_detection_confidence, min_tracking_confidence)
         self.mp_drawing = mp.solutions.drawing_utils
         
-    def process_video(self, video_path: str) -> Tuple[List[np.ndarray], List[dict], dict]:
+        # MediaPipe landmark ids in LANDMARK_NAMES order
+        self._landmark_ids = [getattr(self.mp_pose.PoseLandmark, name.upper()) for name in LANDMARK_NAMES]
+        
+    def process_video(self, video_path: str, keep_frames: bool = True,
+                      on_frame: Optional[Callable[[int, np.ndarray, Optional[dict]], None]] = None
+                      ) -> Tuple[List[np.ndarray], List[dict], dict]:
         """
         Process video and extract pose landmarks for each frame
         
         Args:
             video_path: Path to the video file
+            keep_frames: Whether to return the decoded frames. Retaining
+                         them takes width x height x 3 bytes per frame, so
+                         pass False when only landmarks are needed
+            on_frame: Optional callback called as on_frame(frame_idx, frame,
+                      landmarks) for every frame as it is processed, e.g. to
+                      write frames drawn with visualize_landmarks to a
+                      cv2.VideoWriter without retaining them
             
         Returns:
-            Tuple of (frames, landmarks_list, video_info)
+            Tuple of (frames, landmarks_list, video_info); frames is empty
+            unless keep_frames is True
         """
-        cap = cv2.VideoCapture(video_path)
+        cap, video_info = self._open_video(video_path)
         
-        if not cap.isOpened():
-            raise ValueError(f"Unable to open video file: {video_path}")
+        frames = []
+        landmarks_list = []
+        frame_iter = self._iter_frames(video_path, video_info, self._extract_landmarks, cap=cap)
+        for frame_idx, (frame, landmarks) in enumerate(frame_iter):
+            if on_frame is not None:
+                on_frame(frame_idx, frame, landmarks)
+            if keep_frames:
+                frames.append(frame)
+            landmarks_list.append(landmarks)
+        
+        return frames, landmarks_list, video_info
+    
+    def stream_video(self, video_path: str) -> Tuple[Iterator[Tuple[np.ndarray, Optional[dict]]], dict]:
+        """
+        Open a video and lazily extract pose landmarks frame by frame
+        
+        Unlike process_video, decoded frames are not retained, so memory use
+        stays at one frame regardless of video length. The video is only
+        opened for decoding once iteration starts, so an iterator that is
+        never used holds no capture.
+        
+        Args:
+            video_path: Path to the video file
+            
+        Returns:
+            Tuple of (iterator of (frame, landmarks) pairs, video_info)
+        """
+        cap, video_info = self._open_video(video_path)
+        cap.release()
+        
+        return self._iter_frames(video_path, video_info, self._extract_landmarks), video_info
+    
+    def extract_landmarks_buffer(self, video_path: str, pose_stride: int = 1,
+                                 frame_step: int = 1) -> Tuple[LandmarksBuffer, dict]:
+        """
+        Extract pose landmarks for every frame of a video into arrays
+        
+        Landmarks are written straight into per-frame arrays, so neither
+        decoded frames nor per-frame landmark dictionaries are kept.
+        
+        Args:
+            video_path: Path to the video file
+            pose_stride: Run pose estimation on every pose_stride-th frame
+                         only and linearly interpolate the frames between
+                         (default 1, every frame). Vault motion is smooth
+                         over a few frames, so 2 or 3 costs little accuracy
+            frame_step: Analyze only every frame_step-th frame of the video
+                        (default 1, every frame). Skipped frames are neither
+                        decoded into images nor returned, so this is faster
+                        than pose_stride but lowers the time resolution
+            
+        Returns:
+            Tuple of (landmarks, video_info). With frame_step > 1, landmarks
+            hold the analyzed frames only and video_info describes them:
+            'fps' and 'total_frames' are divided by frame_step, which is
+            stored as 'frame_step'
+        """
+        if pose_stride < 1:
+            raise ValueError(f"pose_stride must be at least 1, got {pose_stride}")
+        if frame_step < 1:
+            raise ValueError(f"frame_step must be at least 1, got {frame_step}")
+        
+        cap, video_info = self._open_video(video_path)
+        if frame_step > 1:
+            # Describe the analyzed frames, not the video
+            video_info['fps'] /= frame_step
+            video_info['total_frames'] = -(-video_info['total_frames'] // frame_step)
+            video_info['frame_step'] = frame_step
+        
+        rows = [
+            row for _, row in
+            self._iter_frames(video_path, video_info, self._extract_landmark_array,
+                              pose_stride, frame_step, cap=cap)
+        ]
+        landmarks = LandmarksBuffer.from_arrays(rows)
+        
+        if pose_stride > 1:
+            # Fill the frames skipped between consecutive pose estimates
+            landmarks = landmarks.interpolate_gaps(pose_stride)
+        
+        return landmarks, video_info
+    
+    def _open_video(self, video_path: str) -> Tuple[cv2.VideoCapture, dict]:
+        """Open a video for pose extraction and read its metadata"""
+        cap = self._open_capture(video_path)
         
         # Get video properties
         fps = cap.get(cv2.CAP_PROP_FPS)
@@ -51,59 +317,87 @@ class VideoProcessor:
             'total_frames': total_frames
         }
         
-        frames = []
-        landmarks_list = []
-        frame_count = 0
-        
         print(f"Processing video: {video_path}")
         print(f"FPS: {fps}, Resolution: {frame_width}x{frame_height}, Total frames: {total_frames}")
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
+        return cap, video_info
+    
+    def _open_capture(self, video_path: str) -> cv2.VideoCapture:
+        """Open a video for decoding"""
+        # Prefer FFmpeg, which decodes on all cores, and only fall back to
+        # probing the other backends for files it cannot open. Decode on a
+        # hardware decoder (NVDEC, VA-API, D3D11, VideoToolbox, ...) when the
+        # backend finds one; otherwise OpenCV decodes in software
+        for backend in self._VIDEO_BACKENDS:
+            cap = cv2.VideoCapture(video_path, backend,
+                                   [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+            if cap.isOpened():
                 break
+        else:
+            raise ValueError(f"Unable to open video file: {video_path}")
+        
+        return cap
+    
+    def _iter_frames(self, video_path: str, video_info: dict, extract: Callable, pose_stride: int = 1,
+                     frame_step: int = 1, cap: Optional[cv2.VideoCapture] = None
+                     ) -> Iterator[Tuple[np.ndarray, Any]]:
+        """
+        Yield (frame, landmarks) pairs from a video, releasing its capture when done
+        
+        The video is opened when iteration starts, unless an open capture of
+        it is passed as cap for a caller that iterates right away.
+        Landmarks are converted by extract(pose_landmarks, frame_height,
+        frame_width), or None for frames without a detected pose. Pose
+        estimation runs on every pose_stride-th frame only; landmarks of
+        the other frames are None. Only every frame_step-th frame of the
+        video is yielded at all.
+        """
+        frame_height = video_info['height']
+        frame_width = video_info['width']
+        total_frames = video_info['total_frames']
+        frame_count = 0
+        
+        frame_bytes = max(1, frame_height * frame_width * 3)
+        read_ahead = min(self._READ_AHEAD_FRAMES,
+                         max(self._MIN_READ_AHEAD_FRAMES, self._READ_AHEAD_BYTES // (2 * frame_bytes)))
+        
+        if cap is None:
+            cap = self._open_capture(video_path)
+        try:
+            # Drop tracking state from any previous video
+            self.pose.reset()
             
-            # Convert BGR to RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Process the frame
-            results = self.pose.process(frame_rgb)
-            
-            frames.append(frame)
-            
-            if results.pose_landmarks:
-                # Extract landmarks as dictionary
-                landmarks = self._extract_landmarks(results.pose_landmarks, frame_height, frame_width)
-                landmarks_list.append(landmarks)
-            else:
-                landmarks_list.append(None)
-            
-            frame_count += 1
-            if frame_count % 30 == 0:
-                print(f"Processed {frame_count}/{total_frames} frames")
+            frames = _read_ahead(cap, read_ahead, rgb_stride=pose_stride, frame_step=frame_step)
+            try:
+                for frame, frame_rgb in frames:
+                    landmarks = None
+                    
+                    if frame_rgb is not None:
+                        # Process the frame
+                        results = self.pose.process(frame_rgb)
+                        
+                        if results.pose_landmarks:
+                            landmarks = extract(results.pose_landmarks, frame_height, frame_width)
+                    
+                    yield frame, landmarks
+                    
+                    frame_count += 1
+                    if frame_count % 30 == 0:
+                        print(f"Processed {frame_count}/{total_frames} frames")
+            finally:
+                frames.close()
+        finally:
+            cap.release()
         
-        cap.release()
         print(f"Video processing complete. Processed {frame_count} frames.")
-        
-        return frames, landmarks_list, video_info
     
     def _extract_landmarks(self, pose_landmarks, frame_height: int, frame_width: int) -> dict:
         """Extract pose landmarks into a structured dictionary"""
         landmarks = {}
         
-        # Key landmarks for pole vault analysis
-        landmark_names = [
-            'NOSE', 'LEFT_SHOULDER', 'RIGHT_SHOULDER',
-            'LEFT_ELBOW', 'RIGHT_ELBOW', 'LEFT_WRIST', 'RIGHT_WRIST',
-            'LEFT_HIP', 'RIGHT_HIP', 'LEFT_KNEE', 'RIGHT_KNEE',
-            'LEFT_ANKLE', 'RIGHT_ANKLE', 'LEFT_HEEL', 'RIGHT_HEEL',
-            'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX'
-        ]
-        
-        for name in landmark_names:
-            landmark_id = getattr(self.mp_pose.PoseLandmark, name)
+        for name, landmark_id in zip(LANDMARK_NAMES, self._landmark_ids):
             landmark = pose_landmarks.landmark[landmark_id]
-            landmarks[name.lower()] = {
+            landmarks[name] = {
                 'x': landmark.x * frame_width,
                 'y': landmark.y * frame_height,
                 'z': landmark.z * frame_width,  # Normalized depth
@@ -112,30 +406,60 @@ class VideoProcessor:
         
         return landmarks
     
-    def visualize_landmarks(self, frame: np.ndarray, landmarks: Optional[dict]) -> np.ndarray:
+    def _extract_landmark_array(self, pose_landmarks, frame_height: int, frame_width: int) -> np.ndarray:
+        """Extract pose landmarks into a (len(LANDMARK_NAMES), 4) array of (x, y, z, visibility)"""
+        landmark = pose_landmarks.landmark
+        
+        row = np.array(
+            [(lm.x, lm.y, lm.z, lm.visibility) for lm in map(landmark.__getitem__, self._landmark_ids)],
+            dtype=np.float32
+        )
+        row[:, :3] *= (frame_width, frame_height, frame_width)  # z is normalized depth
+        
+        return row
+    
+    def visualize_landmarks(self, frame: np.ndarray, landmarks: Optional[dict],
+                            dst: Optional[np.ndarray] = None, in_place: bool = False) -> np.ndarray:
         """
         Visualize pose landmarks on a frame
         
         Args:
             frame: Video frame
             landmarks: Dictionary of landmarks
+            dst: Optional preallocated buffer with the same shape and dtype as
+                 frame; reusing it across frames avoids one allocation per call
+            in_place: Draw directly on frame instead of a copy, for callers
+                      that do not need the original frame afterwards
+                      (ignored when dst is given)
             
         Returns:
             Frame with landmarks drawn
         """
-        annotated_frame = frame.copy()
+        if dst is not None:
+            np.copyto(dst, frame)
+            annotated_frame = dst
+        elif in_place:
+            annotated_frame = frame
+        else:
+            annotated_frame = frame.copy()
         
         if landmarks is None:
             return annotated_frame
         
         # Draw key points
-        for name, lm in landmarks.items():
+        for lm in landmarks.values():
             if lm['visibility'] > 0.5:
-                x, y = int(lm['x']), int(lm['y'])
-                cv2.circle(annotated_frame, (x, y), 5, (0, 255, 0), -1)
+                cv2.circle(annotated_frame, (int(lm['x']), int(lm['y'])), 5, (0, 255, 0), -1)
         
         return annotated_frame
     
     def close(self):
-        """Release resources"""
-        self.pose.close()
+        """
+        Release the pose model
+        
+        A shared model (see get_pose_model) is only dereferenced; it is
+        released when the interpreter exits.
+        """
+        if self.pose is not None and not self._shared_model:
+            self.pose.close()
+        self.pose = None
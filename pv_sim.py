@@ -7,7 +7,6 @@ Main application for analyzing pole vault videos
 import argparse
 import sys
 import os
-from pv_analyzer import VideoProcessor, PhaseDetector, EnergyCalculator, PerformanceComparator
 
 
 def main():
@@ -32,6 +31,12 @@ Examples:
                        help='Pixel to meter conversion ratio (default: 0.01)')
     parser.add_argument('--output', type=str, default=None,
                        help='Output file for analysis results (default: print to console)')
+    parser.add_argument('--pose-stride', type=int, default=1,
+                       help='Estimate pose on every Nth frame and interpolate the rest (default: 1)')
+    parser.add_argument('--model-complexity', type=int, default=2, choices=(0, 1, 2),
+                       help='MediaPipe pose model complexity; lower is faster but less accurate (default: 2)')
+    parser.add_argument('--frame-step', type=int, default=1,
+                       help='Analyze only every Nth frame of the video, for quick runs (default: 1)')
     
     args = parser.parse_args()
     
@@ -44,6 +49,22 @@ Examples:
         print(f"Error: Invalid mass: {args.mass}. Must be between 0 and 200 kg.")
         sys.exit(1)
     
+    if args.pose_stride < 1:
+        print(f"Error: Invalid pose stride: {args.pose_stride}. Must be at least 1.")
+        sys.exit(1)
+    
+    if args.frame_step < 1:
+        print(f"Error: Invalid frame step: {args.frame_step}. Must be at least 1.")
+        sys.exit(1)
+    
+    # Import the analyzer only now, so --help and input errors do not wait
+    # for OpenCV and MediaPipe to load
+    try:
+        from pv_analyzer import VideoProcessor, PhaseDetector, EnergyCalculator, PerformanceComparator
+    except ImportError as e:
+        print(f"Error: {e}. Install the dependencies with: pip install -r requirements.txt")
+        sys.exit(1)
+    
     print("=" * 80)
     print("AI_PVSim - Pole Vault Video Analysis System")
     print("=" * 80)
@@ -56,20 +77,23 @@ Examples:
     try:
         # Step 1: Process video and extract pose landmarks
         print("[1/4] Processing video and extracting pose landmarks...")
-        video_processor = VideoProcessor()
-        frames, landmarks_list, video_info = video_processor.process_video(args.video)
+        video_processor = VideoProcessor(model_complexity=args.model_complexity)
+        # Only the landmark arrays are kept in memory, not the decoded frames
+        landmarks, video_info = video_processor.extract_landmarks_buffer(
+            args.video, pose_stride=args.pose_stride, frame_step=args.frame_step
+        )
         video_processor.close()
         
-        if not landmarks_list or all(lm is None for lm in landmarks_list):
+        if not landmarks.valid.any():
             print("Error: No pose landmarks detected in video. Ensure the athlete is visible.")
             sys.exit(1)
         
-        print(f"✓ Extracted landmarks from {len(landmarks_list)} frames\n")
+        print(f"✓ Extracted landmarks from {len(landmarks)} frames\n")
         
         # Step 2: Detect pole vault phases
         print("[2/4] Detecting pole vault phases...")
         phase_detector = PhaseDetector()
-        phases = phase_detector.detect_phases(landmarks_list, video_info)
+        phases = phase_detector.detect_phases(landmarks, video_info)
         
         if not phases:
             print("Error: No phases detected in video.")
@@ -86,7 +110,7 @@ Examples:
             pixel_to_meter_ratio=args.pixel_ratio
         )
         phase_energies = energy_calculator.calculate_phase_energies(
-            landmarks_list, phases, video_info
+            landmarks, phases, video_info
         )
         
         print("✓ Energy calculations complete\n")
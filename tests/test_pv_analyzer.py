@@ -2,10 +2,303 @@
 Unit tests for the AI_PVSim system
 """
 
+import os
+import tempfile
+import threading
+import time
+import types
 import unittest
+from unittest import mock
+import cv2
+import mediapipe as mp
 import numpy as np
 from pv_analyzer import VideoProcessor, PhaseDetector, EnergyCalculator, PerformanceComparator
-from pv_analyzer.phase_detector import VaultPhase
+from pv_analyzer.landmarks import LANDMARK_INDEX, LandmarksBuffer
+from pv_analyzer.phase_detector import NO_PHASE, PHASE_ORDER, VaultPhase, _rolling_mean
+from pv_analyzer.video_processor import _read_ahead, _shared_pose_model
+
+
+class TestLandmarksBuffer(unittest.TestCase):
+    """Test the struct-of-arrays landmark storage"""
+    
+    def test_from_dict_list_with_missing_frames_and_landmarks(self):
+        """Test that absent frames and landmarks are stored as NaN"""
+        landmarks = {
+            'left_hip': {'x': 100, 'y': 200, 'z': 0, 'visibility': 0.9},
+            'right_hip': {'x': 120, 'y': 210, 'z': 0, 'visibility': 0.8}
+        }
+        buffer = LandmarksBuffer.from_dict_list([landmarks, None, landmarks])
+        
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.coords.dtype, np.float32)
+        self.assertEqual(buffer.valid.tolist(), [True, False, True])
+        np.testing.assert_allclose(
+            buffer.coords[0, LANDMARK_INDEX['right_hip']], [120, 210, 0, 0.8], rtol=1e-6
+        )
+        self.assertTrue(np.isnan(buffer.coords[0, LANDMARK_INDEX['nose']]).all())
+        self.assertTrue(np.isnan(buffer.coords[1]).all())
+    
+    def test_slice_returns_view(self):
+        """Test that slicing a buffer selects frames without copying"""
+        buffer = LandmarksBuffer.from_dict_list([None] * 5)
+        sliced = buffer[1:3]
+        
+        self.assertEqual(len(sliced), 2)
+        self.assertTrue(np.shares_memory(sliced.coords, buffer.coords))
+    
+    def test_interpolate_gaps_fills_only_short_interior_runs(self):
+        """Test that interpolation fills short gaps between frames with landmarks"""
+        coords = np.full((9, len(LANDMARK_INDEX), 4), np.nan, dtype=np.float32)
+        valid = np.array([False, True, False, False, True, False, False, False, True])
+        for frame in np.flatnonzero(valid):
+            coords[frame] = [frame * 3.0, 10.0, 0.0, frame / 10]
+        
+        filled = LandmarksBuffer(coords, valid).interpolate_gaps(max_gap=3)
+        
+        # Frames 2-3 lie in a 3-frame gap; frame 0 and frames 5-7 are not filled
+        self.assertEqual(filled.valid.tolist(), [False, True, True, True, True, False, False, False, True])
+        np.testing.assert_allclose(filled.coords[2:4, 0, :3], [[6, 10, 0], [9, 10, 0]], rtol=1e-6)
+        np.testing.assert_allclose(filled.coords[2:4, 0, 3], [0.1, 0.4], rtol=1e-6)
+        self.assertFalse(valid[2])
+    
+    def test_from_arrays_matches_from_dict_list(self):
+        """Test that per-frame arrays and dictionaries build the same buffer"""
+        landmarks = {
+            name: {'x': 10.0 * i, 'y': 5.0 * i, 'z': 0.0, 'visibility': 0.5}
+            for i, name in enumerate(LANDMARK_INDEX)
+        }
+        row = np.array([[lm['x'], lm['y'], lm['z'], lm['visibility']] for lm in landmarks.values()],
+                       dtype=np.float32)
+        
+        from_arrays = LandmarksBuffer.from_arrays([None, row, row])
+        from_dicts = LandmarksBuffer.from_dict_list([None, landmarks, landmarks])
+        
+        np.testing.assert_array_equal(from_arrays.valid, from_dicts.valid)
+        np.testing.assert_array_equal(from_arrays.coords, from_dicts.coords)
+
+
+class StubPose:
+    """Pose model stand-in that places every landmark by the frame index in the image"""
+    
+    def __init__(self):
+        self.processed = []
+        self.resets = 0
+        self.closed = False
+    
+    def process(self, image):
+        # Frames of TestVideoProcessor's video encode their index in the blue channel
+        frame_idx = int(round(image[..., 2].mean() / 20))
+        self.processed.append(frame_idx)
+        landmark = types.SimpleNamespace(x=0.01 * frame_idx, y=0.25, z=0.0, visibility=0.9)
+        return types.SimpleNamespace(pose_landmarks=types.SimpleNamespace(landmark=[landmark] * 33))
+    
+    def reset(self):
+        self.resets += 1
+    
+    def close(self):
+        self.closed = True
+
+
+class TestVideoProcessor(unittest.TestCase):
+    """Test video reading and pose extraction"""
+    
+    NUM_FRAMES = 12
+    
+    @classmethod
+    def setUpClass(cls):
+        """Write a short video whose frame index is encoded in its colors"""
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.video_path = os.path.join(cls.temp_dir.name, 'frames.avi')
+        writer = cv2.VideoWriter(cls.video_path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (32, 24))
+        for i in range(cls.NUM_FRAMES):
+            frame = np.zeros((24, 32, 3), dtype=np.uint8)
+            frame[..., 0] = 20 * i
+            frame[..., 2] = 240 - 20 * i
+            writer.write(frame)
+        writer.release()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+    
+    @staticmethod
+    def frame_index(frame):
+        """Recover the index written into a frame's blue channel"""
+        return int(round(frame[..., 0].mean() / 20))
+    
+    @staticmethod
+    def make_processor():
+        """Create a VideoProcessor that uses StubPose instead of MediaPipe"""
+        processor = VideoProcessor.__new__(VideoProcessor)
+        processor.pose = StubPose()
+        processor._shared_model = False
+        processor._landmark_ids = list(range(17))
+        return processor
+    
+    def test_read_ahead_rgb_frames_under_slow_consumer(self):
+        """Test that reused RGB buffers hold their own frame while the queue is full"""
+        cap = cv2.VideoCapture(self.video_path)
+        
+        indices = []
+        for frame, frame_rgb in _read_ahead(cap, 2):
+            time.sleep(0.005)
+            self.assertFalse(frame_rgb.flags.writeable)
+            np.testing.assert_array_equal(frame_rgb, frame[..., ::-1])
+            indices.append(self.frame_index(frame))
+        cap.release()
+        
+        self.assertEqual(indices, list(range(self.NUM_FRAMES)))
+    
+    def test_read_ahead_frame_step(self):
+        """Test that frame_step yields every Nth frame starting with the first"""
+        for frame_step in (2, 3):
+            cap = cv2.VideoCapture(self.video_path)
+            indices = [self.frame_index(frame) for frame, _ in _read_ahead(cap, 4, frame_step=frame_step)]
+            cap.release()
+            
+            self.assertEqual(indices, list(range(0, self.NUM_FRAMES, frame_step)))
+    
+    def test_read_ahead_close_stops_reader(self):
+        """Test that closing the iterator early stops the reader thread"""
+        cap = cv2.VideoCapture(self.video_path)
+        
+        frames = _read_ahead(cap, 2)
+        next(frames)
+        frames.close()
+        cap.release()
+        
+        self.assertFalse(any(thread.name == 'video-reader' for thread in threading.enumerate()))
+    
+    def test_extract_landmarks_buffer_with_frame_step(self):
+        """Test that frame_step describes the analyzed frames in video_info"""
+        processor = self.make_processor()
+        
+        landmarks, video_info = processor.extract_landmarks_buffer(self.video_path, frame_step=3)
+        
+        self.assertEqual(processor.pose.processed, [0, 3, 6, 9])
+        self.assertTrue(landmarks.valid.all())
+        self.assertAlmostEqual(video_info['fps'], 10.0)
+        self.assertEqual(video_info['total_frames'], 4)
+        self.assertEqual(video_info['frame_step'], 3)
+        np.testing.assert_allclose(landmarks.coords[:, 0, :2], [[0, 6], [0.96, 6], [1.92, 6], [2.88, 6]], rtol=1e-5)
+    
+    def test_extract_landmarks_buffer_with_pose_stride(self):
+        """Test that pose_stride estimates every Nth frame and interpolates the frames between"""
+        processor = self.make_processor()
+        
+        landmarks, video_info = processor.extract_landmarks_buffer(self.video_path, pose_stride=3)
+        
+        self.assertEqual(processor.pose.processed, [0, 3, 6, 9])
+        self.assertEqual(len(landmarks), self.NUM_FRAMES)
+        self.assertEqual(video_info['total_frames'], self.NUM_FRAMES)
+        
+        # Frames after the last estimate have nothing to interpolate towards
+        self.assertEqual(landmarks.valid.tolist(), [True] * 10 + [False] * 2)
+        np.testing.assert_allclose(landmarks.coords[:10, 0, 0], 0.32 * np.arange(10), rtol=1e-5, atol=1e-6)
+    
+    def test_stream_video_opens_video_on_first_frame(self):
+        """Test that an unused stream holds no capture and the pose model is reset on first use"""
+        processor = self.make_processor()
+        captures = []
+        
+        def open_capture(video_path):
+            cap = VideoProcessor._open_capture(processor, video_path)
+            captures.append(cap)
+            return cap
+        processor._open_capture = open_capture
+        
+        frame_iter, video_info = processor.stream_video(self.video_path)
+        self.assertEqual(video_info['total_frames'], self.NUM_FRAMES)
+        self.assertFalse(any(cap.isOpened() for cap in captures))
+        self.assertEqual(processor.pose.resets, 0)
+        
+        next(frame_iter)
+        self.assertTrue(captures[-1].isOpened())
+        self.assertEqual(processor.pose.resets, 1)
+        
+        frame_iter.close()
+        self.assertFalse(captures[-1].isOpened())
+    
+    def test_process_video_without_keeping_frames(self):
+        """Test that keep_frames=False returns no frames and on_frame sees every frame in order"""
+        processor = self.make_processor()
+        seen = []
+        
+        def on_frame(frame_idx, frame, landmarks):
+            seen.append((frame_idx, self.frame_index(frame), landmarks is not None))
+        
+        frames, landmarks_list, video_info = processor.process_video(
+            self.video_path, keep_frames=False, on_frame=on_frame
+        )
+        
+        self.assertEqual(frames, [])
+        self.assertEqual(len(landmarks_list), self.NUM_FRAMES)
+        self.assertEqual(seen, [(i, i, True) for i in range(self.NUM_FRAMES)])
+    
+    @unittest.skipUnless(hasattr(mp, 'solutions'), "requires the MediaPipe solutions API")
+    def test_shared_model_is_shared_and_left_open(self):
+        """Test that processors sharing the pose model get one instance that close() leaves open"""
+        _shared_pose_model.cache_clear()
+        self.addCleanup(_shared_pose_model.cache_clear)
+        
+        with mock.patch('pv_analyzer.video_processor._create_pose_model', side_effect=lambda *args: StubPose()):
+            first = VideoProcessor(shared_model=True)
+            second = VideoProcessor(shared_model=True)
+            own = VideoProcessor()
+        shared_pose, own_pose = first.pose, own.pose
+        
+        self.assertIs(second.pose, shared_pose)
+        self.assertIsNot(own_pose, shared_pose)
+        
+        first.close()
+        self.assertFalse(shared_pose.closed)
+        self.assertIs(second.pose, shared_pose)
+        
+        own.close()
+        self.assertTrue(own_pose.closed)
+    
+    def test_visualize_landmarks_into_dst(self):
+        """Test that drawing into dst leaves the input frame unchanged"""
+        processor = self.make_processor()
+        frame = np.zeros((24, 32, 3), dtype=np.uint8)
+        dst = np.empty_like(frame)
+        landmarks = {'nose': {'x': 10, 'y': 12, 'z': 0, 'visibility': 0.9}}
+        
+        annotated = processor.visualize_landmarks(frame, landmarks, dst=dst)
+        
+        self.assertIs(annotated, dst)
+        self.assertFalse(frame.any())
+        np.testing.assert_array_equal(dst[12, 10], (0, 255, 0))
+    
+    def test_visualize_landmarks_in_place(self):
+        """Test that in_place=True draws on and returns the given frame"""
+        processor = self.make_processor()
+        frame = np.zeros((24, 32, 3), dtype=np.uint8)
+        landmarks = {'nose': {'x': 10, 'y': 12, 'z': 0, 'visibility': 0.9},
+                     'left_hip': {'x': 25, 'y': 5, 'z': 0, 'visibility': 0.1}}
+        
+        annotated = processor.visualize_landmarks(frame, landmarks, in_place=True)
+        
+        self.assertIs(annotated, frame)
+        np.testing.assert_array_equal(frame[12, 10], (0, 255, 0))
+        np.testing.assert_array_equal(frame[5, 25], (0, 0, 0))
+    
+    def test_read_ahead_reraises_reader_errors(self):
+        """Test that an error while reading reaches the consumer after the frames read before it"""
+        class FailingCapture:
+            reads = 0
+            
+            def read(self):
+                self.reads += 1
+                if self.reads == 3:
+                    raise RuntimeError("decoder failed")
+                return True, np.zeros((4, 4, 3), dtype=np.uint8)
+        
+        frames = []
+        with self.assertRaisesRegex(RuntimeError, "decoder failed"):
+            for frame, _ in _read_ahead(FailingCapture(), 4):
+                frames.append(frame)
+        self.assertEqual(len(frames), 2)
 
 
 class TestPhaseDetector(unittest.TestCase):
@@ -48,6 +341,79 @@ class TestPhaseDetector(unittest.TestCase):
         self.assertIn('phase', phases[0])
         self.assertIn('start_frame', phases[0])
         self.assertIn('end_frame', phases[0])
+    
+    def test_detect_phases_accepts_landmarks_buffer(self):
+        """Test that a LandmarksBuffer gives the same phases as a list of dicts"""
+        landmarks_list = [
+            None if i % 7 == 3 else {
+                'left_hip': {'x': 100 + 4 * i, 'y': 200, 'z': 0, 'visibility': 0.9},
+                'right_hip': {'x': 120 + 4 * i, 'y': 200, 'z': 0, 'visibility': 0.9},
+                'left_shoulder': {'x': 100 + 4 * i, 'y': 180, 'z': 0, 'visibility': 0.9},
+                'right_shoulder': {'x': 120 + 4 * i, 'y': 180, 'z': 0, 'visibility': 0.9},
+                'left_ankle': {'x': 100 + 4 * i, 'y': 250, 'z': 0, 'visibility': 0.9},
+                'right_ankle': {'x': 120 + 4 * i, 'y': 250, 'z': 0, 'visibility': 0.9}
+            }
+            for i in range(40)
+        ]
+        video_info = {'fps': 30}
+        
+        from_list = PhaseDetector().detect_phases(landmarks_list, video_info)
+        from_buffer = PhaseDetector().detect_phases(LandmarksBuffer.from_dict_list(landmarks_list), video_info)
+        
+        self.assertEqual(from_buffer, from_list)
+    
+    def test_phase_codes_match_detected_phases(self):
+        """Test that per-frame phase codes agree with the detected phases"""
+        landmarks = {
+            'left_hip': {'x': 100, 'y': 200, 'z': 0, 'visibility': 0.9},
+            'right_hip': {'x': 120, 'y': 200, 'z': 0, 'visibility': 0.9},
+            'left_shoulder': {'x': 100, 'y': 180, 'z': 0, 'visibility': 0.9},
+            'right_shoulder': {'x': 120, 'y': 180, 'z': 0, 'visibility': 0.9},
+            'left_ankle': {'x': 100, 'y': 250, 'z': 0, 'visibility': 0.9},
+            'right_ankle': {'x': 120, 'y': 250, 'z': 0, 'visibility': 0.9}
+        }
+        detector = PhaseDetector()
+        phases = detector.detect_phases([None, landmarks, landmarks, None, landmarks], {'fps': 30})
+        
+        codes = detector.phase_codes
+        self.assertEqual(codes.tolist()[0], NO_PHASE)
+        self.assertEqual(codes.tolist()[3], NO_PHASE)
+        for phase_info in phases:
+            segment = codes[phase_info['start_frame']:phase_info['end_frame'] + 1]
+            self.assertTrue(all(PHASE_ORDER[code] == phase_info['phase'] for code in segment if code != NO_PHASE))
+    
+    def test_velocities_around_missing_frames(self):
+        """Test that velocity falls back to one-frame differences next to missing frames"""
+        com_x = 4.0 * np.arange(12, dtype=np.float32)
+        valid = np.ones(12, dtype=bool)
+        valid[6] = False
+        
+        velocities = PhaseDetector()._calculate_velocities(com_x, valid, fps=30)
+        
+        expected = np.full(12, 120.0)
+        expected[[0, 6, 7]] = 0.0
+        np.testing.assert_allclose(velocities, expected, rtol=1e-5)
+    
+    def test_rolling_mean_truncates_windows_at_edges(self):
+        """Test that smoothing averages only the frames inside the video"""
+        values = np.array([3.0, -1.0, 4.0, 1.0, -5.0, 9.0, 2.0])
+        
+        smoothed = _rolling_mean(values, 2)
+        
+        expected = [values[max(0, i - 2):i + 3].mean() for i in range(len(values))]
+        np.testing.assert_allclose(smoothed, expected)
+    
+    def test_classify_all_applies_first_matching_rule(self):
+        """Test that frames take the first phase whose thresholds they meet"""
+        velocities = np.array([60.0, 30.0, 10.0, 0.0, 0.0, 0.0, -10.0])
+        heights = np.array([100.0, 150.0, 250.0, 350.0, 320.0, 220.0, 50.0])
+        angles = np.array([10.0, 0.0, -20.0, 100.0, 70.0, 40.0, 90.0])
+        
+        codes = PhaseDetector()._classify_all(velocities, heights, angles)
+        
+        expected = [VaultPhase.RUN, VaultPhase.PLANT, VaultPhase.TAKEOFF, VaultPhase.EXTENSION_INVERSION,
+                    VaultPhase.SWING_UP, VaultPhase.SWING_UP, VaultPhase.RUN]
+        self.assertEqual([PHASE_ORDER[code] for code in codes], expected)
 
 
 class TestEnergyCalculator(unittest.TestCase):
@@ -89,6 +455,18 @@ class TestEnergyCalculator(unittest.TestCase):
         self.assertIn('kinetic_energy', energies['run'])
         self.assertIn('potential_energy', energies['run'])
         self.assertIn('total_energy', energies['run'])
+    
+    def test_kinetic_energy_skips_pairs_with_missing_frames(self):
+        """Test that frame pairs without landmarks on both sides have no kinetic energy"""
+        calculator = EnergyCalculator(athlete_mass=70.0, pixel_to_meter_ratio=0.01)
+        
+        com = np.array([[0, 0], [10, 0], [np.nan, np.nan], [30, 0], [40, 0]], dtype=np.float32)
+        valid = np.array([True, True, False, True, True])
+        
+        kinetic = calculator._calculate_kinetic_energy(com, valid, fps=10)
+        
+        # 10 px per frame at 10 fps and 0.01 m/px is 1 m/s
+        np.testing.assert_allclose(kinetic, [0, 35, 0, 0, 35], rtol=1e-6)
 
 
 class TestPerformanceComparator(unittest.TestCase):
@@ -127,6 +505,108 @@ class TestPerformanceComparator(unittest.TestCase):
         self.assertIn('reference_name', mondo_comparison)
         self.assertIn('phase_comparisons', mondo_comparison)
         self.assertIn('overall_score', mondo_comparison)
+    
+    def test_compare_performance_batch_matches_single(self):
+        """Test that batch comparison matches comparing athletes one by one"""
+        comparator = PerformanceComparator()
+        
+        athletes = [
+            {
+                'run': {'energy_generated': 2100, 'duration': 3.5},
+                'plant': {'energy_generated': 150, 'duration': 0.6}
+            },
+            {
+                'take-off': {'energy_generated': 320, 'duration': 0.1}
+            }
+        ]
+        masses = [70.0, 82.5]
+        
+        batch = comparator.compare_performance_batch(athletes, masses)
+        
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(list(batch[1]['mondo_duplantis']['phase_comparisons']), ['take-off'])
+        self.assertAlmostEqual(
+            batch[1]['mondo_duplantis']['phase_comparisons']['take-off']['reference_energy'], 300 * 82.5 / 79
+        )
+        for athlete_energies, mass, comparisons in zip(athletes, masses, batch):
+            self.assertEqual(comparisons, comparator.compare_performance(athlete_energies, mass))
+    
+    def test_subclass_with_own_reference_athletes(self):
+        """Test that a subclass compares against its own reference athletes"""
+        class CustomComparator(PerformanceComparator):
+            REFERENCE_ATHLETES = {
+                'coach': {
+                    'name': 'Coach',
+                    'mass': 70,
+                    'phase_energies': {'run': {'energy_generated': 1000, 'optimal_duration': 3.0}}
+                }
+            }
+        
+        athlete_energies = {'run': {'energy_generated': 800, 'duration': 3.0}}
+        
+        comparisons = CustomComparator().compare_performance(athlete_energies, 70.0)
+        
+        self.assertEqual(list(comparisons), ['coach'])
+        self.assertAlmostEqual(comparisons['coach']['phase_comparisons']['run']['energy_ratio'], 0.8)
+        self.assertEqual(len(PerformanceComparator().compare_performance(athlete_energies, 70.0)), 2)
+    
+    def test_reference_athlete_added_after_creation(self):
+        """Test that reference athletes added at runtime are compared against"""
+        class CustomComparator(PerformanceComparator):
+            REFERENCE_ATHLETES = dict(PerformanceComparator.REFERENCE_ATHLETES)
+        
+        athlete_energies = {'run': {'energy_generated': 800, 'duration': 3.0}}
+        comparator = CustomComparator()
+        comparator.compare_performance_batch([athlete_energies], [70.0])
+        
+        CustomComparator.REFERENCE_ATHLETES['coach'] = {
+            'name': 'Coach',
+            'mass': 70,
+            'phase_energies': {'run': {'energy_generated': 1000, 'optimal_duration': 3.0}}
+        }
+        comparisons = comparator.compare_performance_batch([athlete_energies], [70.0])[0]
+        
+        self.assertEqual(len(comparisons), 3)
+        self.assertAlmostEqual(comparisons['coach']['phase_comparisons']['run']['energy_ratio'], 0.8)
+    
+    def test_cached_comparisons_follow_reference_data_and_subclasses(self):
+        """Test that repeated comparisons reflect changed reference data and run on the comparator itself"""
+        class CustomComparator(PerformanceComparator):
+            REFERENCE_ATHLETES = {
+                'coach': {
+                    'name': 'Coach',
+                    'mass': 70,
+                    'phase_energies': {'run': {'energy_generated': 1000, 'optimal_duration': 3.0}}
+                }
+            }
+            
+            def __init__(self, label):
+                super().__init__()
+                self.label = label
+        
+        athlete_energies = {'run': {'energy_generated': 800, 'duration': 3.0}}
+        comparator = CustomComparator('test')
+        first = comparator.compare_performance(athlete_energies, 70.0)
+        
+        comparator.REFERENCE_ATHLETES['coach']['phase_energies']['run']['energy_generated'] = 400
+        second = comparator.compare_performance(athlete_energies, 70.0)
+        
+        self.assertAlmostEqual(first['coach']['phase_comparisons']['run']['energy_ratio'], 0.8)
+        self.assertAlmostEqual(second['coach']['phase_comparisons']['run']['energy_ratio'], 2.0)
+    
+    def test_repeated_comparisons_are_independent(self):
+        """Test that modifying a comparison does not affect later identical comparisons"""
+        comparator = PerformanceComparator()
+        athlete_energies = {'run': {'energy_generated': 1500, 'duration': 4.0}}
+        
+        first = comparator.compare_performance(athlete_energies, 70.0)
+        first['mondo_duplantis']['phase_comparisons']['run']['athlete_energy'] = 0.0
+        first['mondo_duplantis']['recommendations'].clear()
+        second = comparator.compare_performance(athlete_energies, 70.0)
+        
+        self.assertEqual(second['mondo_duplantis']['phase_comparisons']['run']['athlete_energy'], 1500.0)
+        self.assertTrue(second['mondo_duplantis']['recommendations'])
+        self.assertEqual(second, comparator.compare_performance_batch([athlete_energies], [70.0])[0])
 
 
 class TestIntegration(unittest.TestCase):